@@ -0,0 +1,28 @@
+'''
+Benchmarks of the Football Scraper. Run them from the project directory on the database data/serieA.db, e.g.
+    python -m benchmarks.ranking
+'''
+
+import time
+
+from instrumentation import profile
+
+
+def measure(function, repeat=5):
+    '''
+    Best wall clock time of repeat calls of function and the number of queries of a single call
+    '''
+    with profile() as recorded:
+        function()
+    best = min(_elapsed(function) for _ in range(repeat))
+    return best, recorded.queries
+
+
+def _elapsed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def report(name, elapsed, queries):
+    print(f"{name:<40} {elapsed * 1000:10.2f} ms {queries:8d} queries")
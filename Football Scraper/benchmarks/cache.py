@@ -0,0 +1,33 @@
+'''
+Benchmark of the read-through cache of cache.py: the rankings of every championship
+computed with an empty cache, read again from memory and read from the store on disk by a new cache
+'''
+
+import os
+import tempfile
+
+import cache
+from benchmarks import measure, report
+from models import Championship
+
+
+def rankings(championships, new_cache=None):
+    if new_cache is not None:
+        cache.CACHE = new_cache()
+    return [championship.ranking() for championship in championships]
+
+
+if __name__ == "__main__":
+    championships = list(Championship.select().order_by(Championship.startyear))
+    name = f"({len(championships)} seasons)"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.db')
+        cases = [('without cache', lambda: cache.Cache(enabled=False)),
+                 ('cold cache', lambda: cache.Cache()),
+                 ('in memory', None),
+                 ('on disk, new process', lambda: cache.Cache(path=path))]
+        cache.CACHE = cache.Cache(path=path)
+        rankings(championships)
+        for case, new_cache in cases:
+            elapsed, queries = measure(lambda: rankings(championships, new_cache), repeat=3)
+            report(f"rankings {case} {name}", elapsed, queries)
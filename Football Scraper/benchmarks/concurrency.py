@@ -0,0 +1,111 @@
+'''
+Check of the concurrent access to the database: reader processes query a new database while
+jsontodb.py --bulk loads it in another process, and count the failed reads (e.g. "database is locked")
+and the slowest ones. The readers wait at most busy_timeout milliseconds for a lock, so a load that blocks them
+fails the check instead of only slowing it. Run it from the directory with the jsons in data/
+    python -m benchmarks.concurrency [--readers 4] [--journal-mode wal] [--busy-timeout 0] [--first 1986] [--last 2020]
+'''
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read(path, journal_mode, busy_timeout, ready, stop, results):
+    '''
+    Reader process: query the database in path until stop is set, then put (reads, errors, latencies) in results.
+    Put None in ready after the first query
+    '''
+    import cache
+    from models import Championship, Match, Standing, fn, init_database
+    cache.CACHE = cache.Cache(enabled=False)
+    init_database(path, journal_mode=journal_mode, busy_timeout=busy_timeout)
+    Match.select().count()
+    ready.put(None)
+    reads, errors, latencies = 0, [], []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            Match.select().count()
+            championship = Championship.select().order_by(Championship.startyear.desc()).first()
+            if championship is not None:
+                championship.ranking()
+                Standing.select(fn.MAX(Standing.matchday)).where(Standing.championship == championship).scalar()
+            reads += 1
+        except Exception as error:
+            errors.append(str(error))
+        latencies.append(time.perf_counter() - start)
+    results.put((reads, errors, latencies))
+
+
+def run(readers, journal_mode, first, last, busy_timeout=0):
+    '''
+    Load the seasons from first to last in a new database while reader processes query it.
+    Return (load, reads, errors, latencies): the completed loader process, the number of reads, their errors
+    and their latencies in seconds, sorted
+    '''
+    from migrations import MODELS
+    from models import db, init_database
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'serieA.db')
+        init_database(path, journal_mode=journal_mode)
+        db.create_tables(MODELS)
+        db.close()
+        context = multiprocessing.get_context('spawn')
+        ready, stop, results = context.Queue(), context.Event(), context.Queue()
+        processes = [context.Process(target=read, args=(path, journal_mode, busy_timeout, ready, stop, results))
+                     for _ in range(readers)]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get()
+        environment = dict(os.environ, SERIEA_DATABASE=path, SERIEA_JOURNAL_MODE=journal_mode)
+        load = subprocess.run([sys.executable, os.path.join(PROJECT, 'jsontodb.py'), '--bulk',
+                               '--first', str(first), '--last', str(last)],
+                              capture_output=True, text=True, env=environment)
+        stop.set()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    reads = sum(outcome[0] for outcome in outcomes)
+    errors = [error for outcome in outcomes for error in outcome[1]]
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[2])
+    return load, reads, errors, latencies
+
+
+def check(readers, journal_mode, first, last, busy_timeout=0):
+    start = time.perf_counter()
+    load, reads, errors, latencies = run(readers, journal_mode, first, last, busy_timeout)
+    elapsed = time.perf_counter() - start
+    print(f"journal_mode={journal_mode}: load {'ok' if load.returncode == 0 else 'FAILED'} in {elapsed:.2f}s, "
+          f"{readers} readers (busy_timeout {busy_timeout} ms): {reads} reads, {len(errors)} errors", end='')
+    print(f", median {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+          if latencies else '')
+    if load.returncode != 0:
+        print(load.stderr)
+    for error in sorted(set(errors)):
+        print(f"    {error}")
+    return load.returncode == 0 and not errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4,
+                        help='number of reader processes')
+    parser.add_argument('--journal-mode', default='wal',
+                        help='journal mode of the database, e.g. wal or delete')
+    parser.add_argument('--busy-timeout', type=int, default=0,
+                        help='milliseconds a reader waits for a lock before failing')
+    parser.add_argument('--first', type=int, default=1986,
+                        help='first season to load')
+    parser.add_argument('--last', type=int, default=2020,
+                        help='last season to load')
+    args = parser.parse_args()
+    if not check(args.readers, args.journal_mode, args.first, args.last, args.busy_timeout):
+        raise SystemExit(1)
@@ -0,0 +1,61 @@
+'''
+Benchmark of a full backfill against the local mirror of benchmarks.fixtures:
+one scrapy process per season sleeping between them, like the old scrape script,
+against a single process crawling all the seasons. It also checks that the outputs are the same
+and exits with status 1 if any season differs.
+Both crawls run without the HTTP cache, so neither is served from the pages downloaded by the other
+    python -m benchmarks.crawl [--first 1986] [--last 2020] [--sleep 5] [--directory data]
+'''
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from benchmarks.fixtures import serve
+
+
+def crawl_serial(url, years, output, sleep):
+    for year in years:
+        subprocess.run(['scrapy', 'crawl', 'match', '-a', f'year={year}', '-a', f'base_url={url}',
+                        '-O', os.path.join(output, f'championship{year}.jsonl'), '-s', 'HTTPCACHE_ENABLED=False',
+                        '-L', 'WARNING'], check=True)
+        time.sleep(sleep)
+
+
+def crawl_single(url, years, output, sleep):
+    subprocess.run(['scrapy', 'crawl', 'match', '-a', f'years={years[0]}-{years[-1]}', '-a', f'base_url={url}',
+                    '-s', f'SEASON_FILES_DIR={output}', '-s', 'HTTPCACHE_ENABLED=False', '-L', 'WARNING'], check=True)
+
+
+def season_lines(output, year):
+    with open(os.path.join(output, f'championship{year}.jsonl')) as season_file:
+        return sorted(season_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first', type=int, default=1986)
+    parser.add_argument('--last', type=int, default=2020)
+    parser.add_argument('--sleep', type=float, default=5,
+                        help='seconds between the seasons of the serial crawl')
+    parser.add_argument('--directory', default='data',
+                        help='directory of the championships served by the mirror')
+    args = parser.parse_args()
+    years = list(range(args.first, args.last + 1))
+
+    server = serve(directory=args.directory)
+    url = f'http://localhost:{server.server_port}'
+    outputs = {}
+    for function in (crawl_serial, crawl_single):
+        outputs[function] = tempfile.mkdtemp()
+        start = time.perf_counter()
+        function(url, years, outputs[function], args.sleep)
+        print(f"{function.__name__:<40} {time.perf_counter() - start:10.2f} s")
+    different = [year for year in years
+                 if season_lines(outputs[crawl_serial], year) != season_lines(outputs[crawl_single], year)]
+    print(f"same output: {not different}")
+    if different:
+        print(f"different seasons: {', '.join(map(str, different))}")
+        raise SystemExit(1)
@@ -0,0 +1,49 @@
+'''
+Benchmark of the form of the teams before every match: the matches of every team read with its
+team_matches_all query and windowed in Python, against the grouped NumPy pass of features.py
+'''
+
+from benchmarks import measure, report
+from features import STATS, WINDOWS, compute_features, load_matches, team_rows
+from models import Championship, Match, Team
+from rules import season_rules
+
+
+def form_queries(teams, window=WINDOWS[0]):
+    seasons = dict(Championship.select(Championship.id, Championship.startyear).tuples())
+    form = {}
+    for team in teams:
+        history = []
+        for match in team.team_matches_all().order_by(Match.date, Match.id):
+            side, scored, taken = (('home', match.team1goals, match.team2goals) if match.team1_id == team.id
+                                   else ('away', match.team2goals, match.team1goals))
+            last = history[-window:]
+            for position, stat in enumerate(STATS):
+                form[match.id, f'{side}_all{window}_{stat}'] = (sum(row[position] for row in last) / len(last)
+                                                                if last else None)
+            rules = season_rules(seasons[match.championship_id])
+            points = rules.points(scored > taken, scored == taken, scored < taken)
+            history.append((points, scored, taken))
+    return form
+
+
+def form_vectorized(window=WINDOWS[0]):
+    features = compute_features(team_rows(load_matches()), (window,))
+    return {(match, name): None if value != value else value
+            for name in features.columns if '_all' in name and not name.endswith('_played')
+            for match, value in features[name].items()}
+
+
+if __name__ == "__main__":
+    teams = list(Team.select())
+    results = {}
+    for function in (form_queries, form_vectorized):
+        arguments = (teams,) if function is form_queries else ()
+        elapsed, queries = measure(lambda: results.__setitem__(function.__name__, function(*arguments)), repeat=1)
+        report(f"{function.__name__} ({len(teams)} teams)", elapsed, queries)
+    expected, computed = results['form_queries'], results['form_vectorized']
+    different = [key for key in expected if (expected[key] is None) != (computed[key] is None) or
+                 expected[key] is not None and abs(expected[key] - computed[key]) > 1e-5]
+    print(f"{len(different)} of {len(expected)} features differ")
+    elapsed, queries = measure(lambda: compute_features(team_rows(load_matches())))
+    report(f"compute_features (windows {WINDOWS})", elapsed, queries)
@@ -0,0 +1,129 @@
+'''
+HTML fixture pages of the archive of www.legaseriea.it rendered from the scraped championships in data/,
+and a local HTTP server that serves them with the urls of the archive. The usage is
+    python -m benchmarks.fixtures [--port 8000]
+then the spider can crawl the local mirror
+    scrapy crawl match -a years=1986-2020 -a base_url=http://localhost:8000 -s SEASON_FILES_DIR=mirror
+The pages can also be saved as files, YEAR/NUMBER.html, with save_pages
+'''
+
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import os
+import re
+import threading
+
+from jsontodb import iter_days
+
+URL_PATTERN = re.compile(r'/(\d{4})-\d{2}/UNICO/UNI/(\d+)$')
+
+
+def render_side(side, team):
+    '''
+        HTML of the box of one of the teams of a match
+    '''
+    scorers = '<br>\n'.join(escape(scorer) for scorer in team['scorers'])
+    return (f'<div class="risultato{side}">\n'
+            f'<h4 class="nomesquadra">{escape(team["name"])}</h4>\n'
+            f'<span>{team["goals"]}</span>\n'
+            f'<p class="marcatori-partita">\n{scorers}\n</p>\n'
+            f'</div>\n')
+
+
+def render_matchday(day):
+    '''
+        HTML page of a matchday dictionary, with the markup parsed by ChampionshipSpider
+    '''
+    date = day['date']
+    boxes = ''.join(f'<div class="box-partita">\n{render_side("sx", match["team1"])}'
+                    f'{render_side("dx", match["team2"])}</div>\n' for match in day['matches'])
+    return (f'<html><head><title>Serie A</title></head><body>\n'
+            f'<section class="risultati">\n'
+            f'<h3>\n{day["number"]}a Giornata - {date["day"]:02d}/{date["month"]:02d}/{date["year"]}\n</h3>\n'
+            f'{boxes}</section>\n</body></html>\n')
+
+
+class Archive:
+    '''
+        Matchdays of the championships in the directory, loaded the first time a season is requested
+    '''
+
+    def __init__(self, directory='data'):
+        self.directory = directory
+        self.seasons = {}
+        self.lock = threading.Lock()
+
+    def page(self, year, number):
+        with self.lock:
+            if year not in self.seasons:
+                path = season_path(self.directory, year)
+                days = iter_days(path) if os.path.exists(path) else []
+                self.seasons[year] = {day['number']: render_matchday(day) for day in days}
+        return self.seasons[year].get(number)
+
+
+def season_path(directory, year):
+    '''
+        Path of the scraped championship year in directory: the json lines file if it exists, the json otherwise
+    '''
+    path = os.path.join(directory, f'championship{year}.jsonl')
+    return path if os.path.exists(path) else os.path.join(directory, f'championship{year}.json')
+
+
+def page_path(output, year, number):
+    return os.path.join(output, str(year), f'{number}.html')
+
+
+def save_pages(years, directory='data', output='pages'):
+    '''
+        Save the pages of the matchdays of the championships years in directory as output/YEAR/NUMBER.html,
+        so the benchmarks parse the same files across commits. Returns the number of pages
+    '''
+    count = 0
+    for year in years:
+        os.makedirs(os.path.join(output, str(year)), exist_ok=True)
+        for day in iter_days(season_path(directory, year)):
+            with open(page_path(output, year, day['number']), 'w') as page_file:
+                page_file.write(render_matchday(day))
+            count += 1
+    return count
+
+
+def serve(port=0, directory='data'):
+    '''
+        Start in a thread an HTTP server of the pages of the championships in directory.
+        Returns the server: its url is http://localhost:{server.server_port}
+    '''
+    archive = Archive(directory)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = URL_PATTERN.search(self.path)
+            page = match and archive.page(int(match.group(1)), int(match.group(2)))
+            if not page:
+                self.send_error(404)
+                return
+            body = page.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('localhost', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--directory', default='data')
+    args = parser.parse_args()
+    server = serve(args.port, args.directory)
+    print(f"Serving the archive of {args.directory} on http://localhost:{server.server_port}")
+    threading.Event().wait()
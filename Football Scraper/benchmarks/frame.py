@@ -0,0 +1,21 @@
+'''
+Benchmark of the per-team summary of every season:
+the rankings of the models against the columnar load_matches_frame and frame_ranking
+'''
+
+from benchmarks import measure, report
+from models import Championship, frame_ranking, load_matches_frame
+
+
+def summary_models():
+    return [championship.ranking() for championship in Championship.select()]
+
+
+def summary_frame():
+    return frame_ranking(load_matches_frame())
+
+
+if __name__ == "__main__":
+    for function in (summary_models, summary_frame):
+        elapsed, queries = measure(function)
+        report(function.__name__, elapsed, queries)
@@ -0,0 +1,109 @@
+'''
+Generator of synthetic championships in the format of the scraped jsons, to benchmark the project on
+archives larger than the real one. It scales the seasons, the teams of every season and the leagues:
+the database has a championship per starting year, so the leagues are written one after the other as
+consecutive seasons, each with its own teams and players. Double round robin, Poisson goals from the
+strength of the teams, scorers from a squad per team. The same arguments give the same files
+    python -m benchmarks.generate [--directory synthetic/data] [--seasons 35] [--teams 20] [--leagues 1]
+The real archive is about 35 seasons of 16 to 20 teams: --seasons 350 or --leagues 10 are 10 times larger
+'''
+
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+
+# Teams of a league that can take part in a season, as a multiple of the teams of a season
+POOL = 1.5
+# Players of the squad of a team
+SQUAD = 25
+# Mean goals of the home and of the away team between teams of the same strength
+HOME_GOALS = 1.5
+AWAY_GOALS = 1.1
+
+
+def round_robin(teams):
+    '''
+        Matchdays of a double round robin of the teams (an even number), as lists of (home, away)
+    '''
+    count = len(teams)
+    rounds = []
+    rotation = list(teams)
+    for _ in range(count - 1):
+        rounds.append([(rotation[i], rotation[count - 1 - i]) for i in range(count // 2)])
+        rotation = [rotation[0], rotation[-1]] + rotation[1:-1]
+    return rounds + [[(away, home) for home, away in matchday] for matchday in rounds]
+
+
+def scorers(rng, team, goals):
+    '''
+        Scorers of the goals of team, with the minute as on the archive ("Name 34'")
+    '''
+    players = rng.integers(1, SQUAD + 1, goals)
+    minutes = np.sort(rng.integers(1, 91, goals))
+    return [f"{team} P{player:02d} {minute}'" for player, minute in zip(players, minutes)]
+
+
+def season(rng, year, teams, strength):
+    '''
+        Matchdays dictionaries of the championship starting in year between teams
+    '''
+    start = datetime.date(year, 9, 1)
+    days = []
+    for index, matchday in enumerate(round_robin(teams)):
+        date = start + datetime.timedelta(days=7 * index)
+        matches = []
+        for home, away in matchday:
+            goals = rng.poisson([HOME_GOALS * strength[home] / strength[away],
+                                 AWAY_GOALS * strength[away] / strength[home]])
+            matches.append({'team1': {'name': home, 'goals': int(goals[0]),
+                                      'scorers': scorers(rng, home, goals[0])},
+                            'team2': {'name': away, 'goals': int(goals[1]),
+                                      'scorers': scorers(rng, away, goals[1])}})
+        days.append({'number': index + 1, 'date': {'day': date.day, 'month': date.month, 'year': date.year},
+                     'refyear': year, 'matches': matches})
+    return days
+
+
+def generate(directory, seasons=35, teams=20, leagues=1, first=1986, seed=0):
+    '''
+        Write the championships of leagues leagues of seasons seasons each with teams teams
+        (rounded up to an even number) in directory, as championshipYEAR.json from the year first.
+        Returns the list of the years
+    '''
+    teams += teams % 2
+    if first + seasons * leagues - 1 > 9998:
+        raise ValueError(f"{seasons * leagues} seasons from {first} go beyond the year 9998")
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    years = []
+    for league in range(leagues):
+        pool = [f"L{league + 1} Team{index:03d}" for index in range(int(teams * POOL))]
+        strength = dict(zip(pool, rng.lognormal(0, 0.3, len(pool))))
+        for index in range(seasons):
+            year = first + league * seasons + index
+            playing = list(rng.choice(pool, teams, replace=False))
+            with open(os.path.join(directory, f'championship{year}.json'), 'w') as json_file:
+                json.dump(season(rng, year, playing, strength), json_file)
+            years.append(year)
+    return years
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directory', default='synthetic/data',
+                        help='directory of the jsons')
+    parser.add_argument('--seasons', type=int, default=35,
+                        help='seasons of every league')
+    parser.add_argument('--teams', type=int, default=20,
+                        help='teams of every season')
+    parser.add_argument('--leagues', type=int, default=1,
+                        help='number of leagues')
+    parser.add_argument('--first', type=int, default=1986,
+                        help='starting year of the first season')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    years = generate(args.directory, args.seasons, args.teams, args.leagues, args.first, args.seed)
+    print(f"{len(years)} championships ({years[0]}-{years[-1]}) written in {args.directory}.")
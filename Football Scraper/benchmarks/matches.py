@@ -0,0 +1,23 @@
+'''
+Benchmark of the iteration over the matches of a season, as done in the example notebook.
+The number of queries must not depend on the number of matches: tests/test_queries.py checks it
+'''
+
+from benchmarks import measure, report
+from models import Championship, Match, get_results
+
+
+def season_results(championship):
+    return [get_results(team, championship.championship_matches.where(
+        (Match.team1 == team) | (Match.team2 == team))) for team in championship.playing_teams]
+
+
+def season_descriptions(championship):
+    return [str(match) for match in Match.with_teams().where(Match.championship == championship)]
+
+
+if __name__ == "__main__":
+    championship = Championship.select().order_by(Championship.startyear.desc()).get()
+    for function in (season_results, season_descriptions):
+        elapsed, queries = measure(lambda: function(championship))
+        report(f"{function.__name__} ({championship})", elapsed, queries)
@@ -0,0 +1,95 @@
+'''
+Benchmark of ChampionshipSpider.parse on the pages of benchmarks.fixtures:
+the css selectors of the first version of the spider against the compiled selectors.
+It reports pages/s and cpu time per page and checks that the items are identical
+    python -m benchmarks.parse [--first 1986] [--last 2020] [--directory data]
+'''
+
+from datetime import datetime
+import argparse
+import json
+import re
+import time
+
+from itemadapter import ItemAdapter
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks.fixtures import render_matchday, season_path
+from jsontodb import iter_days
+from seriea.spiders.match_spider import ChampionshipSpider
+
+
+def css_parse(response):
+    '''
+        parse of the first version of the spider, with a css query for every field
+    '''
+    title = response.css('section.risultati h3::text').get().strip()
+    number, date = title.split("-")
+    refyear = response.request.url.split("/")[-4]
+    date = datetime.strptime(date.strip(), '%d/%m/%Y')
+    number = int(re.findall(r'\d+', number)[0])
+    matches = [css_parse_game(game) for game in response.css('section.risultati div.box-partita')]
+    yield {'number': number,
+           'date': {'day': date.day,
+                    'month': date.month,
+                    'year': date.year},
+           'refyear': int(refyear.split("-")[0]),
+           'matches': matches,
+           }
+
+
+def css_parse_game(game):
+    sx = game.css('div.risultatosx')
+    teamsx = sx.css('h4.nomesquadra::text').get().strip()
+    goalssx = int(sx.css('span::text').get().strip())
+    scorerssx = [player.strip() for player in sx.css(
+        'p.marcatori-partita::text').getall() if player.strip() != '']
+    dx = game.css('div.risultatodx')
+    teamdx = dx.css('h4.nomesquadra::text').get().strip()
+    goalsdx = int(dx.css('span::text').get().strip())
+    scorersdx = [player.strip() for player in dx.css(
+        'p.marcatori-partita::text').getall() if player.strip() != '']
+    return {'team1': {'name': teamsx, 'goals': goalssx, 'scorers': scorerssx},
+            'team2': {'name': teamdx, 'goals': goalsdx, 'scorers': scorersdx}}
+
+
+def pages(years, directory):
+    '''
+        Bodies and urls of the pages of the matchdays of the championships in years
+    '''
+    result = []
+    for year in years:
+        for day in iter_days(season_path(directory, year)):
+            url = f"{ChampionshipSpider.base_url}/{year}-{(year + 1) % 100:02d}/UNICO/UNI/{day['number']}"
+            result.append((url, render_matchday(day).encode()))
+    return result
+
+
+def run(parse, bodies):
+    '''
+        Items of parse on fresh responses of bodies, as done by scrapy for every download
+    '''
+    items = []
+    for url, body in bodies:
+        response = HtmlResponse(url=url, body=body, encoding='utf-8', request=Request(url))
+        items.extend(ItemAdapter(item).asdict() for item in parse(response))
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first', type=int, default=1986)
+    parser.add_argument('--last', type=int, default=2020)
+    parser.add_argument('--directory', default='data')
+    args = parser.parse_args()
+
+    bodies = pages(range(args.first, args.last + 1), args.directory)
+    spider = ChampionshipSpider()
+    outputs = {}
+    for name, parse in (('css selectors', css_parse), ('compiled selectors', spider.parse)):
+        wall, cpu = time.perf_counter(), time.process_time()
+        outputs[name] = run(parse, bodies)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"{name:<30} {len(bodies) / wall:10.0f} pages/s {cpu / len(bodies) * 1000:8.3f} ms cpu/page")
+    same = len({json.dumps(items) for items in outputs.values()}) == 1
+    print(f"identical items: {same}")
@@ -0,0 +1,23 @@
+'''
+Benchmark of the final ranking of every championship:
+the per-team generator Championship.compute_ranking against the queries of Championship.ranking
+'''
+
+from benchmarks import measure, report
+from models import Championship
+
+
+def ranking_generator(championships):
+    return [sorted(championship.compute_ranking(), key=lambda d: d['points'], reverse=True)
+            for championship in championships]
+
+
+def ranking_query(championships):
+    return [championship.ranking() for championship in championships]
+
+
+if __name__ == "__main__":
+    championships = list(Championship.select().order_by(Championship.startyear))
+    for function in (ranking_generator, ranking_query):
+        elapsed, queries = measure(lambda: function(championships), repeat=3)
+        report(f"{function.__name__} ({len(championships)} seasons)", elapsed, queries)
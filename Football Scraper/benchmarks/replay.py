@@ -0,0 +1,35 @@
+'''
+Benchmark of the standings after every matchday of every championship:
+a ranking query per matchday against the NumPy replay of replay.py
+'''
+
+from benchmarks import measure, report
+from models import Championship, Match, RESULTS_KEYS, SQL, aggregate_results, fn, team_rows
+from replay import load_replays
+
+
+def standings_queries(championships):
+    tables = {}
+    for championship in championships:
+        last = championship.championship_matches.select(fn.MAX(Match.number)).scalar()
+        for matchday in range(1, last + 1):
+            rows = team_rows((Match.championship == championship) & (Match.number <= matchday))
+            query = aggregate_results(rows).order_by(
+                SQL('points').desc(), (fn.SUM(rows.c.scored) - fn.SUM(rows.c.taken)).desc(), SQL('scored').desc())
+            tables[championship.startyear, matchday] = [dict(zip(RESULTS_KEYS, row)) for row in query.tuples()]
+    return tables
+
+
+def standings_replay(championships):
+    replays = load_replays([championship.startyear for championship in championships])
+    return {(year, int(matchday)): replay.table(matchday)
+            for year, replay in replays.items() for matchday in replay.matchdays}
+
+
+if __name__ == "__main__":
+    championships = list(Championship.select().order_by(Championship.startyear))
+    for function in (standings_queries, standings_replay):
+        elapsed, queries = measure(lambda: function(championships), repeat=1)
+        report(f"{function.__name__} ({len(championships)} seasons)", elapsed, queries)
+    elapsed, queries = measure(lambda: load_replays())
+    report("load_replays (standings matrices only)", elapsed, queries)
@@ -0,0 +1,372 @@
+'''
+Benchmark suite of the ingest, parse and analytics paths on synthetic championships (benchmarks.generate).
+Every benchmark reports the best time of --repeat runs, the throughput, the queries of a run and the peak
+of the memory it allocates (tracemalloc). The results are saved in --results as COMMIT.json, one entry per scale,
+so the runs of two commits can be compared. Run it from the project directory:
+    python -m benchmarks.suite [--seasons 35] [--teams 20] [--leagues 1] [--only ingest,ranking]
+                               [--workdir synthetic] [--results .benchmarks] [--compare [COMMIT]]
+The jsons, the saved pages and the database are kept in --workdir and reused while the scale does not change.
+With --compare the benchmarks are compared with the last commit with results at the same scale (or COMMIT),
+and the suite fails if any of them is --threshold times slower
+'''
+
+from contextlib import redirect_stdout
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+import tracemalloc
+
+from scrapy.http import HtmlResponse, Request
+
+import cache
+from benchmarks.fixtures import page_path, save_pages
+from benchmarks.generate import generate
+from features import compute_features, load_matches, team_rows
+from instrumentation import profile
+from jsontodb import load_championship_bulk
+from models import (Championship, DataVersion, Goal, Match, Matchday, Player, Rating, Standing, Team, db, fn,
+                    head_to_head_matrix, init_database)
+from seriea.spiders.match_spider import ChampionshipSpider
+from simulate import load_forecast
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Championships, pairs of teams and teams of the benchmarks that run a query per item
+SAMPLE = 20
+
+
+class Workload:
+    '''
+    Synthetic championships of a scale in workdir: the jsons in data/, their pages in pages/ and the database serieA.db.
+    They are generated again only if the manifest of workdir has another scale
+    '''
+    FILES = ('data', 'pages', 'serieA.db', 'serieA.db-wal', 'serieA.db-shm', 'manifest.json')
+
+    def __init__(self, workdir, seasons, teams, leagues, seed=0):
+        self.workdir = os.path.abspath(workdir)
+        self.scale = {'seasons': seasons, 'teams': teams, 'leagues': leagues, 'seed': seed}
+        self.database = os.path.join(self.workdir, 'serieA.db')
+        self.manifest = {}
+
+    @property
+    def key(self):
+        return '{seasons}x{teams}x{leagues}'.format(**self.scale)
+
+    @property
+    def years(self):
+        return self.manifest['years']
+
+    def prepare(self):
+        '''
+            Generate the jsons and save the pages if needed, and move to workdir, where jsontodb reads data/
+        '''
+        path = os.path.join(self.workdir, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                self.manifest = json.load(manifest_file)
+        if self.manifest.get('scale') != self.scale:
+            for name in self.FILES:
+                name = os.path.join(self.workdir, name)
+                if os.path.isdir(name):
+                    shutil.rmtree(name)
+                elif os.path.exists(name):
+                    os.remove(name)
+            data = os.path.join(self.workdir, 'data')
+            years = generate(data, **self.scale)
+            pages = save_pages(years, data, os.path.join(self.workdir, 'pages'))
+            self.manifest = {'scale': self.scale, 'years': years, 'pages': pages, 'loaded': False}
+            self.save()
+        os.chdir(self.workdir)
+        init_database(self.database)
+
+    def save(self):
+        with open(os.path.join(self.workdir, 'manifest.json'), 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file)
+
+    def create(self):
+        '''
+            Empty database
+        '''
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+        self.manifest['loaded'] = False
+        self.save()
+        db.connect()
+        db.create_tables([Team, Championship, Match, Player, Goal, Matchday, DataVersion, Standing, Rating])
+
+    def ingest(self):
+        '''
+            Load every championship with the bulk loader. Returns the number of matches
+        '''
+        teams, players = {}, {}
+        with redirect_stdout(io.StringIO()):
+            count = sum(load_championship_bulk(year, teams, players) for year in self.years)
+        self.manifest['loaded'] = True
+        self.save()
+        return count
+
+    def load(self):
+        '''
+            Database with every championship, loaded if the last ingest did not complete
+        '''
+        if not self.manifest['loaded']:
+            self.create()
+            self.ingest()
+
+
+def bench_parse(workload):
+    '''
+        ChampionshipSpider.parse of the saved pages, read from disk
+    '''
+    spider = ChampionshipSpider()
+
+    def run():
+        count = 0
+        for year in workload.years:
+            number = 1
+            while os.path.exists(page_path('pages', year, number)):
+                url = f"{spider.base_url}/{year}-{(year + 1) % 100:02d}/UNICO/UNI/{number}"
+                with open(page_path('pages', year, number), 'rb') as page_file:
+                    response = HtmlResponse(url=url, body=page_file.read(), encoding='utf-8', request=Request(url))
+                count += len(list(spider.parse(response)))
+                number += 1
+        return count
+    return run
+
+
+def bench_ingest(workload):
+    '''
+        jsontodb.load_championship_bulk of every championship in an empty database
+    '''
+    workload.create()
+    return workload.ingest
+
+
+def bench_ranking(workload):
+    '''
+        Championship.ranking of every championship
+    '''
+    workload.load()
+    championships = list(Championship.select())
+    return lambda: len([championship.ranking() for championship in championships])
+
+
+def bench_compute_ranking(workload):
+    '''
+        Championship.compute_ranking, a query per team, of SAMPLE championships
+    '''
+    workload.load()
+    championships = list(Championship.select().order_by(Championship.startyear))
+    championships = championships[::max(1, len(championships) // SAMPLE)][:SAMPLE]
+    return lambda: len([championship.compute_ranking() for championship in championships])
+
+
+def bench_head_to_head(workload):
+    '''
+        head_to_head_matrix of every pair of teams in every championship
+    '''
+    workload.load()
+    return lambda: len(head_to_head_matrix(by_season=True))
+
+
+def bench_derby(workload):
+    '''
+        Team.head_to_head of the SAMPLE pairs of teams that played the most matches
+    '''
+    workload.load()
+    pairs = list(Match.select(Match.pairlow, Match.pairhigh).group_by(Match.pairlow, Match.pairhigh)
+                 .order_by(fn.COUNT(Match.id).desc(), Match.pairlow, Match.pairhigh).limit(SAMPLE).tuples())
+    teams = {team.id: team for team in Team.select()}
+    return lambda: len([teams[low].head_to_head(teams[high]) for low, high in pairs])
+
+
+def bench_timeline(workload):
+    '''
+        Team.season_timeline of the SAMPLE teams that played the most championships
+    '''
+    workload.load()
+    teams = list(Team.select().join(Match, on=(Match.team1 == Team.id)).group_by(Team.id)
+                 .order_by(fn.COUNT(Match.championship.distinct()).desc(), Team.id).limit(SAMPLE))
+    return lambda: len([team.season_timeline() for team in teams])
+
+
+def bench_simulate(workload):
+    '''
+        Forecast.simulate, in this process, of 20000 seasons of the second half of the last championship
+    '''
+    workload.load()
+    year = workload.years[-1]
+    matchdays = Match.select(fn.MAX(Match.number)).join(Championship).where(Championship.startyear == year).scalar()
+    forecast = load_forecast(year, matchdays // 2)
+    return lambda: forecast.simulate(20000, workers=1).seasons
+
+
+def bench_features(workload):
+    '''
+        features.compute_features, the form of both teams before every match, from a single query
+    '''
+    workload.load()
+    return lambda: len(compute_features(team_rows(load_matches())))
+
+
+# Benchmarks, in the order they run, and the unit of the items they count
+BENCHMARKS = {'parse': (bench_parse, 'pages'),
+              'ingest': (bench_ingest, 'matches'),
+              'ranking': (bench_ranking, 'seasons'),
+              'compute_ranking': (bench_compute_ranking, 'seasons'),
+              'head_to_head': (bench_head_to_head, 'pairs'),
+              'derby': (bench_derby, 'pairs'),
+              'timeline': (bench_timeline, 'teams'),
+              'simulate': (bench_simulate, 'seasons'),
+              'features': (bench_features, 'matches')}
+
+
+def measure(benchmark, workload, repeat=3, memory=True):
+    '''
+        Best time of repeat runs of benchmark, throughput, queries and peak of the memory allocated by a run.
+        benchmark(workload) prepares a run and returns it: a function returning the number of items it processed
+    '''
+    function, unit = BENCHMARKS[benchmark]
+    times = []
+    for _ in range(repeat):
+        run = function(workload)
+        start = time.perf_counter()
+        items = run()
+        times.append(time.perf_counter() - start)
+    run = function(workload)
+    if memory:
+        tracemalloc.start()
+    with profile() as recorded:
+        run()
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    tracemalloc.stop()
+    return {'seconds': min(times), 'items': items, 'unit': unit, 'throughput': items / min(times),
+            'queries': recorded.queries, 'memory': peak}
+
+
+def git(*args):
+    return subprocess.run(['git', *args], cwd=PROJECT, capture_output=True, text=True).stdout.strip()
+
+
+def save_results(directory, key, run):
+    '''
+        Save the run in directory/COMMIT.json (COMMIT-dirty.json with uncommitted changes) under the key of its scale
+    '''
+    os.makedirs(directory, exist_ok=True)
+    name = run['commit'] + ('-dirty' if run['dirty'] else '')
+    path = os.path.join(directory, f'{name}.json')
+    results = load_results(directory, name)
+    # a run of some of the benchmarks keeps the results of the others
+    if key in results:
+        run = dict(run, benchmarks=dict(results[key]['benchmarks'], **run['benchmarks']))
+    results[key] = run
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    return path
+
+
+def load_results(directory, commit):
+    path = os.path.join(directory, f'{commit}.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def previous_run(directory, key, commit, dirty):
+    '''
+        Run at the scale key of the last ancestor of commit with results, commit itself for a dirty run
+    '''
+    for ancestor in git('rev-list', '--max-count=1000', commit).split()[0 if dirty else 1:]:
+        run = load_results(directory, ancestor).get(key)
+        if run is not None:
+            return run
+    return None
+
+
+def compare(run, before, threshold):
+    '''
+        Print the ratios of the times and of the memory of run and before. Returns the benchmarks threshold times slower
+    '''
+    print(f"\ncompared with {before['commit'][:10]}{' (dirty)' if before['dirty'] else ''} of {before['date']}")
+    slower = []
+    for name, result in run['benchmarks'].items():
+        previous = before['benchmarks'].get(name)
+        if previous is None:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        memory = (f"{result['memory'] / previous['memory']:6.2f}x memory"
+                  if result['memory'] and previous['memory'] else '')
+        flag = ' SLOWER' if ratio > threshold else ''
+        print(f"{name:<20} {previous['seconds'] * 1000:10.1f} ms -> {result['seconds'] * 1000:10.1f} ms "
+              f"{ratio:6.2f}x time {memory}{flag}")
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def report(name, result):
+    memory = f"{result['memory'] / 2 ** 20:8.1f} MiB" if result['memory'] is not None else ''
+    print(f"{name:<20} {result['seconds'] * 1000:10.1f} ms {result['throughput']:12.0f} {result['unit'] + '/s':<10}"
+          f" {result['queries']:8d} queries {memory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seasons', type=int, default=35,
+                        help='seasons of every league')
+    parser.add_argument('--teams', type=int, default=20,
+                        help='teams of every season')
+    parser.add_argument('--leagues', type=int, default=1,
+                        help='number of leagues')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='comma separated benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of every benchmark')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not trace the memory allocated by a run')
+    parser.add_argument('--workdir', default='synthetic',
+                        help='directory of the synthetic jsons, pages and database')
+    parser.add_argument('--results', default='.benchmarks',
+                        help='directory of the results of every commit')
+    parser.add_argument('--compare', nargs='?', const='', default=None, metavar='COMMIT',
+                        help='compare with the results of COMMIT (default: the last commit with results)')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='time ratio above which --compare fails')
+    args = parser.parse_args()
+    names = [name for name in args.only.split(',') if name]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    results = os.path.abspath(args.results)
+
+    # the cached methods would be measured reading the cache
+    cache.CACHE = cache.Cache(enabled=False)
+    workload = Workload(args.workdir, args.seasons, args.teams, args.leagues)
+    start = time.perf_counter()
+    workload.prepare()
+    print(f"{len(workload.years)} seasons, {workload.manifest['pages']} pages ({workload.key}) "
+          f"ready in {time.perf_counter() - start:.1f}s")
+    commit = git('rev-parse', 'HEAD')
+    run = {'commit': commit, 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+           'date': datetime.datetime.now().isoformat(timespec='seconds'),
+           'python': platform.python_version(), 'machine': platform.machine(),
+           'scale': workload.scale, 'benchmarks': {}}
+    for name in [name for name in BENCHMARKS if name in names]:
+        run['benchmarks'][name] = measure(name, workload, args.repeat, not args.no_memory)
+        report(name, run['benchmarks'][name])
+    print(f"results saved in {save_results(results, workload.key, run)}")
+    if args.compare is not None:
+        before = (load_results(results, git('rev-parse', args.compare)).get(workload.key) if args.compare
+                  else previous_run(results, workload.key, commit, run['dirty']))
+        if before is None:
+            print("no results to compare with")
+        elif compare(run, before, args.threshold):
+            raise SystemExit(1)
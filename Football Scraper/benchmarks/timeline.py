@@ -0,0 +1,31 @@
+'''
+Benchmark of the history of a team across every championship, as done in the example notebook:
+a query per season and a full ranking per season against the set-based queries of Team.season_timeline
+'''
+
+from benchmarks import measure, report
+from models import Championship, Match, Team, fn, get_results
+
+
+def timeline_loop(team, years):
+    matches = [Match.select().where(((Match.team1 == team) | (Match.team2 == team)) &
+                                    (Match.championship == Championship.get(startyear=year))) for year in years]
+    details = [get_results(team, season) for season in matches]
+    ranking = [next(index for index, d in enumerate(sorted(Championship.get(startyear=year).compute_ranking(),
+                                                           key=lambda d: d['points'], reverse=True))
+                    if d['team'] == team.name) + 1 for year in years]
+    return details, ranking
+
+
+def timeline_query(team, years):
+    return team.season_timeline(years[0], years[-1])
+
+
+if __name__ == "__main__":
+    # the team that played the most championships, so the notebook loop never misses a season
+    team = (Team.select().join(Match, on=(Match.team1 == Team.id))
+            .group_by(Team.id).order_by(fn.COUNT(Match.championship.distinct()).desc()).get())
+    years = [row['year'] for row in team.season_timeline()]
+    for function in (timeline_loop, timeline_query):
+        elapsed, queries = measure(lambda: function(team, years), repeat=3)
+        report(f"{function.__name__} ({team}, {len(years)} seasons)", elapsed, queries)
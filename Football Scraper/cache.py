@@ -0,0 +1,142 @@
+'''
+Module with a read-through cache of the results of the aggregate queries of the models (rankings, stats of a team).
+An entry is keyed by the function and its arguments and remembers the data version it was computed at:
+the ingest bumps the version of the championships it writes (models.bump_version), so a stale entry
+is recomputed the first time it is read and the closed seasons are never computed again.
+The entries are kept in memory with a LRU policy and, optionally, in a sqlite file shared by the processes.
+The cache is off unless the environment variable SERIEA_CACHE is 1, or it is set up with
+    import cache
+    cache.CACHE = cache.Cache(maxsize=1024, path='data/cache.db')
+'''
+
+import copy
+import functools
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from peewee import Model, Node, SqliteDatabase
+
+
+class Cache:
+    '''
+    Read-through cache with a LRU in memory and an optional store on disk.
+        maxsize: number of entries kept in memory
+        path: sqlite file of the store on disk, None to keep the entries only in memory
+        enabled: with False every get computes the value
+
+        get(key, version, compute): the value of key at version, computed by compute() if it is missing or stale
+        stats(): counters of hits (in memory and on disk), misses, stale entries and evictions
+        clear(): remove every entry, in memory and on disk
+    '''
+
+    def __init__(self, maxsize=256, path=None, enabled=True):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(('hits', 'disk_hits', 'misses', 'stale', 'evictions'), 0)
+        self.store = None
+        if path is not None:
+            self.store = SqliteDatabase(path, pragmas={'journal_mode': 'wal'})
+            self.store.execute_sql('CREATE TABLE IF NOT EXISTS entry '
+                                   '(key TEXT PRIMARY KEY, version TEXT NOT NULL, value BLOB NOT NULL)')
+
+    def get(self, key, version, compute):
+        if not self.enabled:
+            return compute()
+        version = repr(version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return copy.deepcopy(entry[1])
+        value, found = self._load(key, version)
+        with self.lock:
+            if found:
+                self.counters['disk_hits'] += 1
+            else:
+                self.counters['stale' if entry is not None else 'misses'] += 1
+        if not found:
+            value = compute()
+            self._save(key, version, value)
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return copy.deepcopy(value)
+
+    def _load(self, key, version):
+        if self.store is None:
+            return None, False
+        row = self.store.execute_sql('SELECT value FROM entry WHERE key = ? AND version = ?',
+                                     (key, version)).fetchone()
+        return (pickle.loads(row[0]), True) if row else (None, False)
+
+    def _save(self, key, version, value):
+        if self.store is None:
+            return
+        # the stale entry of the key is replaced, so the store does not grow with the versions
+        with self.store.atomic():
+            self.store.execute_sql('INSERT OR REPLACE INTO entry (key, version, value) VALUES (?, ?, ?)',
+                                   (key, version, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, size=len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.store is not None:
+            self.store.execute_sql('DELETE FROM entry')
+
+
+# Cache used by the decorated methods of the models, off unless SERIEA_CACHE=1
+CACHE = Cache(enabled=os.environ.get('SERIEA_CACHE', '0') == '1')
+# Database without a connection, only used to render the SQL of the query arguments
+SQL_CONTEXT = SqliteDatabase(None)
+
+
+def argument_key(value):
+    '''
+    Plain value identifying an argument of a cached function: the id of a model instance,
+    the SQL of a query or of an expression, the tuple of the elements of a sequence.
+    A model instance is identified only by its id, so the cached functions take saved rows, not edited copies
+    '''
+    if isinstance(value, Model):
+        return type(value).__name__, value.get_id()
+    if isinstance(value, Node):
+        return SQL_CONTEXT.get_sql_context().sql(value).query()
+    if isinstance(value, (list, tuple, range, set, frozenset)):
+        items = [argument_key(item) for item in value]
+        return tuple(sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items)
+    return value
+
+
+def cached(version, scope=None):
+    '''
+    Decorator of a function whose result depends only on its arguments and on the data:
+    version(*args, **kwargs) is the data version the result depends on, e.g. the version of a championship,
+    and scope() names the data, e.g. the path of the database, so different data do not share entries.
+    The result is read from CACHE, and computed only if it is missing or stale.
+    It is always computed if the version or the scope is None, i.e. the data cannot be versioned
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not CACHE.enabled:
+                return function(*args, **kwargs)
+            current = version(*args, **kwargs)
+            name = scope() if scope is not None else ()
+            if current is None or name is None:
+                return function(*args, **kwargs)
+            key = repr((name, function.__module__, function.__qualname__,
+                        argument_key(args), argument_key(sorted(kwargs.items()))))
+            return CACHE.get(key, current, lambda: function(*args, **kwargs))
+        return wrapper
+    return decorator
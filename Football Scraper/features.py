@@ -0,0 +1,366 @@
+'''
+Module that computes the form of the teams before every match, as features of the models of the match outcomes.
+For every match and every window N of WINDOWS it has, for the home team (home_) and for the guest (away_), the mean
+points, goals scored and goals taken in the previous N matches of the team (allN) and in its previous N matches
+at home, or away for the guest (venueN), and how many matches they are (played). The points follow the rules
+of each season and the windows go across the seasons. The features of all the matches are computed at once:
+the rows of the teams are sorted by team and date with NumPy and the sum of every window is a difference
+of cumulative sums.
+The features are stored in a Parquet dataset partitioned by season (default data/features) and optionally
+in the table feature of a sqlite database. The matches added after the last stored one, e.g. a new matchday,
+are appended from the last matches of every team at home and away, kept in state.parquet
+    build_features()          compute and store the features of every match
+    append_features()         append the features of the new matches, or build them again if older matches changed
+    read_features(seasons)    DataFrame of the stored features
+    training_set(seasons)     features and outcome (H, D, A) of the matches
+The usage is
+    python features.py [--rebuild] [--root data/features] [--sqlite data/features.db]
+'''
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from models import Championship, DataVersion, Match, OperationalError, Team, db
+from rules import season_rules
+
+ROOT = 'data/features'
+# Number of previous matches of every window
+WINDOWS = (5, 10)
+STATS = ('points', 'scored', 'taken')
+SCOPES = ('all', 'venue')
+SIDES = ('home', 'away')
+MATCH_COLUMNS = ('id', 'season', 'number', 'date', 'team1', 'team2', 'team1goals', 'team2goals')
+# Rows of the teams: one for the home team (venue 0) and one for the guest (venue 1) of every match
+ROW_COLUMNS = ('id', 'date', 'team', 'venue', 'points', 'scored', 'taken')
+
+
+def feature_columns(windows=WINDOWS):
+    '''
+        Names of the features, e.g. home_all5_points or away_venue10_played
+    '''
+    return [f'{side}_{scope}{window}_{stat}' for side in SIDES for window in windows for scope in SCOPES
+            for stat in STATS + ('played',)]
+
+
+def load_matches(after=None, seasons=None):
+    '''
+        Dictionary of NumPy arrays (MATCH_COLUMNS, the teams as ids) of the matches in date order, read with
+        a single query. Only the matches after the (date, id) after and of the championships starting
+        in the years seasons, if given
+    '''
+    query = (Match.select(Match.id, Championship.startyear, Match.number, Match.date, Match.team1, Match.team2,
+                          Match.team1goals, Match.team2goals)
+             .join(Championship)
+             .order_by(Match.date, Match.id))
+    if after is not None:
+        date, match = after
+        query = query.where((Match.date > date) | ((Match.date == date) & (Match.id > match)))
+    if seasons is not None:
+        query = query.where(Championship.startyear.in_(list(seasons)))
+    columns = list(zip(*db.execute(query).fetchall())) or [()] * len(MATCH_COLUMNS)
+    dtypes = (np.int64, np.int16, np.int8, 'datetime64[D]', np.int64, np.int64, np.int8, np.int8)
+    return {name: np.array(column, dtype=dtype) for name, column, dtype in zip(MATCH_COLUMNS, columns, dtypes)}
+
+
+def team_rows(matches):
+    '''
+        Dictionary of NumPy arrays (ROW_COLUMNS) with the rows of the home team and of the guest of the matches.
+        The points follow the rules of the season
+    '''
+    seasons = np.unique(matches['season'])
+    rules = [season_rules(int(season)) for season in seasons]
+    index = np.searchsorted(seasons, matches['season'])
+    points = {result: np.array([getattr(rule, result) for rule in rules], dtype=np.int8)[index]
+              for result in ('win', 'even', 'loss')}
+    goals1, goals2 = matches['team1goals'], matches['team2goals']
+    points1 = np.where(goals1 > goals2, points['win'], np.where(goals1 == goals2, points['even'], points['loss']))
+    points2 = np.where(goals2 > goals1, points['win'], np.where(goals1 == goals2, points['even'], points['loss']))
+    return {'id': np.tile(matches['id'], 2),
+            'date': np.tile(matches['date'], 2),
+            'team': np.concatenate([matches['team1'], matches['team2']]),
+            'venue': np.repeat(np.array([0, 1], dtype=np.int8), len(goals1)),
+            'points': np.concatenate([points1, points2]).astype(np.int8),
+            'scored': np.concatenate([goals1, goals2]),
+            'taken': np.concatenate([goals2, goals1])}
+
+
+def window_means(group, order, values, windows=WINDOWS):
+    '''
+        For every row and every window, the means of the columns of values over the previous window rows
+        of the same group in the given order (the row excluded) and how many rows they are.
+        Returns a dictionary window -> (means, played)
+    '''
+    index = np.lexsort((order, group))
+    positions = np.arange(len(index))
+    sorted_group = group[index]
+    starts = np.ones(len(index), dtype=bool)
+    starts[1:] = sorted_group[1:] != sorted_group[:-1]
+    # rows of the group before each row, and sums[i] the sum of the rows before the i-th
+    previous = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+    sums = np.zeros((len(index) + 1, values.shape[1]))
+    np.cumsum(values[index], axis=0, out=sums[1:])
+    results = {}
+    for window in windows:
+        played = np.minimum(previous, window)
+        with np.errstate(invalid='ignore'):
+            means = (sums[positions] - sums[positions - played]) / played[:, None]
+        results[window] = (np.empty_like(means), np.empty_like(played))
+        results[window][0][index] = means
+        results[window][1][index] = played
+    return results
+
+
+def compute_features(rows, windows=WINDOWS, matches=None):
+    '''
+        DataFrame of the features (feature_columns) of the matches of the team rows, indexed by the match id
+        in date order. Only of the matches with the ids matches if given, the other rows are their history
+    '''
+    order = np.lexsort((rows['id'], rows['date']))
+    sequence = np.empty(len(order), dtype=np.int64)
+    sequence[order] = np.arange(len(order))
+    values = np.column_stack([rows[stat] for stat in STATS]).astype(np.float64)
+    wanted = np.ones(len(order), dtype=bool) if matches is None else np.isin(rows['id'], matches)
+    # the rows of the home teams and of the guests of the wanted matches, both in date order
+    sides = {side: np.flatnonzero(wanted & (rows['venue'] == venue)) for venue, side in enumerate(SIDES)}
+    sides = {side: selected[np.argsort(sequence[selected])] for side, selected in sides.items()}
+    columns = {}
+    for scope, group in zip(SCOPES, (rows['team'], rows['team'] * 2 + rows['venue'])):
+        for window, (means, played) in window_means(group, sequence, values, windows).items():
+            for side, selected in sides.items():
+                for position, stat in enumerate(STATS):
+                    columns[f'{side}_{scope}{window}_{stat}'] = means[selected, position].astype(np.float32)
+                columns[f'{side}_{scope}{window}_played'] = played[selected].astype(np.int8)
+    return pd.DataFrame({name: columns[name] for name in feature_columns(windows)},
+                        index=pd.Index(rows['id'][sides['home']], name='id'))
+
+
+def features_table(matches, features, windows=WINDOWS):
+    '''
+        Arrow table of the matches (MATCH_COLUMNS, with the names of the teams) with their features
+    '''
+    ids, names = zip(*Team.select(Team.id, Team.name).order_by(Team.id).tuples()) or ((), ())
+    codes = np.full(max(ids, default=0) + 1, -1, dtype=np.int16)
+    codes[list(ids)] = np.arange(len(ids))
+    dictionary = pa.array(names, pa.string())
+    position = pd.Index(matches['id']).get_indexer(features.index)
+    columns = {name: pa.array(matches[name][position]) for name in MATCH_COLUMNS if name not in ('team1', 'team2')}
+    for name in ('team1', 'team2'):
+        columns[name] = pa.DictionaryArray.from_arrays(pa.array(codes[matches[name][position]]), dictionary)
+    for name in feature_columns(windows):
+        columns[name] = pa.array(features[name].to_numpy())
+    return pa.table({name: columns[name] for name in MATCH_COLUMNS + tuple(feature_columns(windows))})
+
+
+def write_features(table, root=ROOT, part=0, sqlite=None):
+    '''
+        Write the table in the partitions season=YEAR of root/matches as part-part.parquet
+        and append it to the table feature of the sqlite database, if given
+    '''
+    seasons = table.column('season').to_numpy()
+    for season in np.unique(seasons):
+        directory = os.path.join(root, 'matches', f'season={season}')
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(table.filter(pa.array(seasons == season)).drop_columns(['season']),
+                       os.path.join(directory, f'part-{part}.parquet'))
+    if sqlite is not None:
+        frame = table.to_pandas()
+        frame['date'] = frame['date'].astype(str)
+        with sqlite3.connect(sqlite) as connection:
+            frame.to_sql('feature', connection, if_exists='replace' if part == 0 else 'append', index=False)
+            connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS feature_id ON feature (id)')
+        connection.close()
+
+
+def write_state(rows, root=ROOT, windows=WINDOWS):
+    '''
+        Keep in root/state.parquet the last max(windows) rows of every team at home and away,
+        the history needed by the features of the next matches
+    '''
+    frame = pd.DataFrame(rows).sort_values(['team', 'venue', 'date', 'id'])
+    frame = frame.groupby(['team', 'venue']).tail(max(windows))
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), os.path.join(root, 'state.parquet'))
+
+
+def read_state(root=ROOT):
+    table = pq.read_table(os.path.join(root, 'state.parquet'))
+    return {name: table.column(name).to_numpy() for name in ROW_COLUMNS}
+
+
+def read_manifest(root=ROOT):
+    '''
+        Windows, number of matches and (date, id) of the last match stored in root, None if there are no features
+    '''
+    path = os.path.join(root, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def last_key(matches):
+    '''
+        (date, id) of the last of the matches in date order, None if there are none
+    '''
+    return (str(matches['date'][-1]), int(matches['id'][-1])) if len(matches['id']) else None
+
+
+def write_manifest(root, windows, count, last, versions):
+    with open(os.path.join(root, 'manifest.json'), 'w') as manifest_file:
+        json.dump({'windows': list(windows), 'count': count, 'last': last, 'versions': versions}, manifest_file)
+
+
+def season_versions():
+    '''
+        Map season (as a string, a key of the manifest) -> data version of its championship (see models.DataVersion),
+        None on a database without the versions
+    '''
+    try:
+        return {str(year): version for year, version in
+                DataVersion.select(Championship.startyear, DataVersion.version).join(Championship).tuples()}
+    except OperationalError:
+        return None
+
+
+def changed_seasons(manifest, versions):
+    '''
+        Seasons whose data changed since the features were stored: the ones with another version,
+        every season (None) if the versions are missing
+    '''
+    if versions is None or manifest.get('versions') is None:
+        return None
+    return sorted(int(season) for season in set(versions) | set(manifest['versions'])
+                  if versions.get(season) != manifest['versions'].get(season))
+
+
+def stored_matches_changed(root, last, seasons=None):
+    '''
+        True if the matches stored in root, optionally only of the seasons, are not the matches
+        of the database up to the last stored (date, id): a matchday corrected or loaded again
+    '''
+    columns = ['id', 'date', 'team1', 'team2', 'team1goals', 'team2goals']
+    stored = read_features(seasons, root)[columns]
+    stored = sorted(zip(stored['id'].tolist(), stored['date'].dt.strftime('%Y-%m-%d').tolist(),
+                        stored['team1'].astype(str).tolist(), stored['team2'].astype(str).tolist(),
+                        stored['team1goals'].tolist(), stored['team2goals'].tolist()))
+    matches = load_matches(seasons=seasons)
+    date, match = np.datetime64(last[0], 'D'), last[1]
+    kept = (matches['date'] < date) | ((matches['date'] == date) & (matches['id'] <= match))
+    names = dict(Team.select(Team.id, Team.name).tuples())
+    database = sorted(zip(matches['id'][kept].tolist(), matches['date'][kept].astype(str).tolist(),
+                          [names[team] for team in matches['team1'][kept].tolist()],
+                          [names[team] for team in matches['team2'][kept].tolist()],
+                          matches['team1goals'][kept].tolist(), matches['team2goals'][kept].tolist()))
+    return stored != database
+
+
+def build_features(root=ROOT, windows=WINDOWS, sqlite=None):
+    '''
+        Compute the features of every match and replace the ones stored in root. Returns the number of matches
+    '''
+    with db.atomic():
+        matches = load_matches()
+        versions = season_versions()
+    rows = team_rows(matches)
+    table = features_table(matches, compute_features(rows, windows), windows)
+    shutil.rmtree(os.path.join(root, 'matches'), ignore_errors=True)
+    os.makedirs(root, exist_ok=True)
+    write_features(table, root, 0, sqlite)
+    write_state(rows, root, windows)
+    write_manifest(root, windows, len(matches['id']), last_key(matches), versions)
+    return len(matches['id'])
+
+
+def append_features(root=ROOT, windows=WINDOWS, sqlite=None):
+    '''
+        Append to root the features of the matches after the last stored one, from the rows in state.parquet.
+        If there are no features yet, the windows changed or other matches were added, changed or deleted
+        the features are built again. Other matches were added or deleted if the stored matches and the new ones
+        are not all the matches. A stored match changed, e.g. a past matchday corrected and loaded again with
+        new ids, if the stored matches of a season whose data version changed differ from the database
+        (all the seasons on a database without the versions). Returns the number of matches added
+    '''
+    manifest = read_manifest(root)
+    if manifest is None or tuple(manifest['windows']) != tuple(windows):
+        return build_features(root, windows, sqlite)
+    with db.atomic():
+        matches = load_matches(manifest['last'])
+        total = Match.select().count()
+        versions = season_versions()
+        seasons = changed_seasons(manifest, versions)
+        changed = manifest['last'] is not None and seasons != [] and stored_matches_changed(
+            root, manifest['last'], seasons)
+    if changed or manifest['count'] + len(matches['id']) != total:
+        return build_features(root, windows, sqlite)
+    if not len(matches['id']):
+        write_manifest(root, windows, total, manifest['last'], versions)
+        return 0
+    state, new = read_state(root), team_rows(matches)
+    rows = {name: np.concatenate([state[name].astype(new[name].dtype), new[name]]) for name in ROW_COLUMNS}
+    table = features_table(matches, compute_features(rows, windows, matches['id']), windows)
+    write_features(table, root, manifest['count'], sqlite)
+    write_state(rows, root, windows)
+    write_manifest(root, windows, total, last_key(matches), versions)
+    return len(matches['id'])
+
+
+def read_features(seasons=None, root=ROOT):
+    '''
+        DataFrame of the stored matches and features in date order, optionally only of the championships
+        starting in the years seasons
+    '''
+    dataset = ds.dataset(os.path.join(root, 'matches'), format='parquet', partitioning='hive')
+    table = dataset.to_table() if seasons is None else dataset.to_table(filter=ds.field('season').isin(list(seasons)))
+    frame = table.to_pandas(date_as_object=False)
+    return frame.sort_values(['date', 'id'], ignore_index=True)
+
+
+def training_set(seasons=None, root=ROOT, dropna=True):
+    '''
+        Features (DataFrame indexed by the match id) and outcome (H home win, D draw, A away win) of the stored
+        matches, optionally only of the championships starting in the years seasons.
+        With dropna, without the matches of a team with no previous match in a scope
+    '''
+    frame = read_features(seasons, root).set_index('id')
+    features = frame[[name for name in frame.columns if name.startswith(SIDES)]]
+    outcome = pd.Series(np.select([frame['team1goals'] > frame['team2goals'],
+                                   frame['team1goals'] < frame['team2goals']], ['H', 'A'], 'D'),
+                        index=frame.index, name='outcome').astype(pd.CategoricalDtype(['H', 'D', 'A']))
+    if dropna:
+        complete = features.notna().all(axis=1)
+        features, outcome = features[complete], outcome[complete]
+    return features, outcome
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true',
+                        help='compute again the features of every match')
+    parser.add_argument('--root', default=ROOT,
+                        help='directory of the dataset')
+    parser.add_argument('--sqlite', default=None,
+                        help='also store the features in the table feature of this sqlite database')
+    parser.add_argument('--windows', type=lambda value: tuple(int(window) for window in value.split(',')),
+                        default=WINDOWS, help='previous matches of every window, e.g. 5,10')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.rebuild:
+        count = build_features(args.root, args.windows, args.sqlite)
+    else:
+        count = append_features(args.root, args.windows, args.sqlite)
+    print(f"{count} matches added to the features in {args.root} in {time.perf_counter() - start:.2f}s.")
+    start = time.perf_counter()
+    features, outcome = training_set(root=args.root)
+    print(f"Training set of {len(features)} matches and {features.shape[1]} features "
+          f"in {time.perf_counter() - start:.2f}s.")
+    print(outcome.value_counts(normalize=True).round(3).to_string())
@@ -0,0 +1,295 @@
+'''
+Module that measures the queries of the database of the models: how many statements a call issues,
+their total time, the rows they fetch and the slowest ones.
+    with profile() as stats:
+        championship.compute_ranking()
+    print(stats.as_dict())
+
+    @profiled
+    def dashboard():
+        ...
+    print(to_prometheus())
+The cursors of the database are wrapped only while a profile is active in some thread, so the queries
+cost nothing more otherwise. The decorator can stay on in production: with SERIEA_PROFILE=0
+(or instrumentation.ENABLED = False) it only adds a boolean check to every call.
+The usage is
+    python instrumentation.py [--year 2010] [--format json|prometheus]
+'''
+
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+
+# Record the calls of the functions decorated with profiled
+ENABLED = os.environ.get('SERIEA_PROFILE', '1') != '0'
+# Number of slowest statements kept by a profile
+SLOWEST = 5
+
+
+class Statement:
+    '''
+    A statement executed by a cursor: its sql, the seconds spent executing it and fetching its rows, the rows fetched
+    '''
+    __slots__ = ('sql', 'seconds', 'rows')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.seconds = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'sql': self.sql, 'seconds': self.seconds, 'rows': self.rows}
+
+
+class Profile:
+    '''
+    Statements executed in a thread while the profile is active.
+        name: label of the profile
+        statements: list of the Statement executed
+        queries/seconds/rows: number of statements, their total time and the rows they fetched
+
+        slowest(count=SLOWEST): the slowest statements
+        as_dict()/to_json(): the totals and the slowest statements
+    '''
+
+    def __init__(self, name=None):
+        self.name = name
+        self.statements = []
+
+    @property
+    def queries(self):
+        return len(self.statements)
+
+    @property
+    def seconds(self):
+        return sum(statement.seconds for statement in self.statements)
+
+    @property
+    def rows(self):
+        return sum(statement.rows for statement in self.statements)
+
+    def slowest(self, count=SLOWEST):
+        return sorted(self.statements, key=lambda statement: statement.seconds, reverse=True)[:count]
+
+    def as_dict(self):
+        return {'name': self.name, 'queries': self.queries, 'seconds': self.seconds, 'rows': self.rows,
+                'slowest': [statement.as_dict() for statement in self.slowest()]}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+
+class InstrumentedCursor:
+    '''
+    Cursor that records the statements it executes, and the rows it fetches, in the profiles
+    '''
+
+    def __init__(self, cursor, profiles):
+        self._cursor = cursor
+        self._profiles = profiles
+        self._statement = None
+
+    def _run(self, method, sql, *args):
+        self._statement = Statement(sql)
+        for profile in self._profiles:
+            profile.statements.append(self._statement)
+        start = time.perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            self._statement.seconds += time.perf_counter() - start
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(self._cursor.execute, sql, parameters)
+
+    def executemany(self, sql, rows):
+        return self._run(self._cursor.executemany, sql, rows)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        if self._statement is not None:
+            self._statement.seconds += time.perf_counter() - start
+            self._statement.rows += (result is not None) if method == self._cursor.fetchone else len(result)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Profiles active in each thread, and number of active profiles of each instrumented database
+_local = threading.local()
+_lock = threading.Lock()
+_installed = {}
+
+
+def _install(database):
+    '''
+        Wrap the cursors of database, if no other profile did
+    '''
+    with _lock:
+        count = _installed.get(id(database), 0)
+        _installed[id(database)] = count + 1
+        if count:
+            return
+        original = type(database).cursor
+
+        def cursor(*args, **kwargs):
+            cursor = original(database, *args, **kwargs)
+            profiles = getattr(_local, 'profiles', None)
+            return InstrumentedCursor(cursor, list(profiles)) if profiles else cursor
+        database.cursor = cursor
+
+
+def _uninstall(database):
+    with _lock:
+        _installed[id(database)] -= 1
+        if not _installed[id(database)]:
+            del _installed[id(database)]
+            del database.cursor
+
+
+class profile:
+    '''
+    Context manager that records in a Profile the statements executed by the current thread on database
+    (models.db if None). The profiles can be nested: a statement is recorded in every active profile
+    '''
+
+    def __init__(self, name=None, database=None):
+        self.profile = Profile(name)
+        self.database = database
+
+    def __enter__(self):
+        if self.database is None:
+            from models import db
+            self.database = db
+        _install(self.database)
+        if not hasattr(_local, 'profiles'):
+            _local.profiles = []
+        _local.profiles.append(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        _local.profiles.remove(self.profile)
+        _uninstall(self.database)
+        return False
+
+
+class Metrics:
+    '''
+    Totals of the calls of the functions decorated with profiled, by name: calls, queries, seconds, rows
+    and the slowest statements.
+        add(name, profile): add a call recorded in profile
+        as_dict()/to_json(): the totals of every function
+        to_prometheus(prefix='seriea_db'): the totals in the Prometheus text format
+        clear(): forget every call
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.functions = {}
+
+    def add(self, name, profile):
+        with self.lock:
+            totals = self.functions.setdefault(name, {'calls': 0, 'queries': 0, 'seconds': 0.0, 'rows': 0,
+                                                      'slowest': []})
+            totals['calls'] += 1
+            totals['queries'] += profile.queries
+            totals['seconds'] += profile.seconds
+            totals['rows'] += profile.rows
+            slowest = totals['slowest'] + [statement.as_dict() for statement in profile.slowest()]
+            totals['slowest'] = sorted(slowest, key=lambda statement: statement['seconds'], reverse=True)[:SLOWEST]
+
+    def as_dict(self):
+        with self.lock:
+            return {name: dict(totals, slowest=list(totals['slowest'])) for name, totals in self.functions.items()}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix='seriea_db'):
+        metrics = [('calls_total', 'calls', 'Calls of the function'),
+                   ('queries_total', 'queries', 'SQL statements executed by the function'),
+                   ('query_seconds_total', 'seconds', 'Seconds spent executing the statements and fetching the rows'),
+                   ('rows_total', 'rows', 'Rows fetched by the statements')]
+        functions = self.as_dict()
+        lines = []
+        for suffix, key, description in metrics:
+            lines.append(f'# HELP {prefix}_{suffix} {description}')
+            lines.append(f'# TYPE {prefix}_{suffix} counter')
+            for name, totals in sorted(functions.items()):
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{prefix}_{suffix}{{function="{label}"}} {totals[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            self.functions.clear()
+
+
+# Metrics of the decorated functions
+METRICS = Metrics()
+
+
+def to_prometheus(prefix='seriea_db'):
+    return METRICS.to_prometheus(prefix)
+
+
+def profiled(function=None, name=None, database=None):
+    '''
+    Decorator that records the queries of every call of the function in METRICS, under name
+    (the qualified name of the function if None). It can be used as @profiled or @profiled(name=...)
+    '''
+    if function is None:
+        return functools.partial(profiled, name=name, database=database)
+    label = name or f'{function.__module__}.{function.__qualname__}'
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return function(*args, **kwargs)
+        with profile(label, database) as recorded:
+            result = function(*args, **kwargs)
+        METRICS.add(label, recorded)
+        return result
+    return wrapper
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--year', type=int, default=None,
+                        help='championship to profile (default: the last one)')
+    parser.add_argument('--format', choices=['json', 'prometheus'], default='json',
+                        help='format of the report')
+    args = parser.parse_args()
+
+    import cache
+    from models import Championship
+    cache.CACHE.enabled = False
+    championship = (Championship.get(Championship.startyear == args.year) if args.year is not None
+                    else Championship.select().order_by(Championship.startyear.desc()).get())
+    team = championship.playing_teams.first()
+    calls = {'Championship.compute_ranking': championship.compute_ranking,
+             'Championship.ranking': championship.ranking,
+             'Championship.top_scorers': championship.top_scorers,
+             'Team.team_matches_all': lambda: [str(match) for match in team.team_matches_all()],
+             'Team.season_timeline': team.season_timeline}
+    for name, call in calls.items():
+        profiled(call, name=name)()
+    print(METRICS.to_json() if args.format == 'json' else METRICS.to_prometheus(), end='')
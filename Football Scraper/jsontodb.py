@@ -1,35 +1,449 @@
 '''
 Module that take the scraped jsons in the data directory, converts them in Models and save them in the database 
+The championships can be a json array of matchdays (data/championshipYEAR.json) or
+json lines with one matchday per line (data/championshipYEAR.jsonl), which can be streamed
 '''
 
-from models import Match, Team, Championship, db
+from models import Match, Matchday, Team, Championship, Standing, Player, Goal, DataVersion, Rating, db
+from models import bump_version, insert_rows, update_standings
+from ratings import forget_ratings, update_ratings
+from peewee import chunked
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import json
 import datetime
+import hashlib
+import os
+import time
+
+# Columns written by the bulk loaders, in the order of the rows built by write_championship
+MATCH_FIELDS = [Match.championship, Match.date, Match.number,
+                Match.team1, Match.team2, Match.team1goals, Match.team2goals,
+                Match.pairlow, Match.pairhigh]
+GOAL_FIELDS = [Goal.match, Goal.championship, Goal.team, Goal.player, Goal.minute]
+# Variables of a statement allowed by SQLite (999 before SQLite 3.32)
+MAX_VARIABLES = 999
+# Rows per INSERT statement. 9 columns per row keep it below the SQLite variables limit
+BATCH_SIZE = 100
+# Largest batch_size below the limit
+MAX_BATCH_SIZE = MAX_VARIABLES // len(MATCH_FIELDS)
+# Matchdays per transaction of the streaming loader
+BATCH_DAYS = 10
+
+
+def day_date(day):
+    '''
+        Date of a matchday from its scraped dictionary
+    '''
+    return datetime.datetime(day['date']['year'],
+                             day['date']['month'],
+                             day['date']['day'])
+
+
+def championship_path(year):
+    '''
+        Path of the scraped championship year/year+1: the json lines file if it exists, the json otherwise
+    '''
+    path = f'data/championship{year}.jsonl'
+    return path if os.path.exists(path) else f'data/championship{year}.json'
+
+
+def iter_days(path):
+    '''
+        Generator of the matchdays dictionaries of a scraped file.
+        A json lines file is parsed one line at a time: a truncated last line, left by an interrupted crawl, is skipped.
+        A json file is parsed at once
+    '''
+    with open(path) as json_file:
+        if not path.endswith('.jsonl'):
+            yield from json.load(json_file)
+            return
+        for line in json_file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith('\n'):
+                    raise
+                print(f"Skipped the truncated last line of {path}.")
+
+
+def day_rows(day):
+    '''
+        Plain tuples (number, date, team1 name, team2 name, team1 goals, team2 goals, team1 scorers, team2 scorers)
+        of the matches of a matchday
+    '''
+    number, date = day.get("number"), day_date(day)
+    return [(number, date, match["team1"]["name"], match["team2"]["name"],
+             match["team1"]["goals"], match["team2"]["goals"],
+             match["team1"].get("scorers", []), match["team2"].get("scorers", []))
+            for match in day['matches']]
+
+
+def day_digest(day):
+    '''
+        Hash of the content of a matchday dictionary
+    '''
+    return hashlib.sha1(json.dumps(day, sort_keys=True).encode()).hexdigest()
+
+
+def save_digests(championship_id, digests):
+    '''
+        Store the digests (number -> hash) of the matchdays of a championship
+    '''
+    for batch in chunked(list(digests.items()), BATCH_SIZE):
+        (Matchday.insert_many([(championship_id, number, digest) for number, digest in batch],
+                              fields=[Matchday.championship, Matchday.number, Matchday.digest])
+         .on_conflict_replace().execute())
+
+
+def team_ids():
+    '''
+        Map name -> id of all the teams in the database
+    '''
+    return {name: id for id, name in Team.select(Team.id, Team.name).tuples()}
+
+
+def resolve_teams(names, teams):
+    '''
+        Add to the map teams (name -> id) the names that are not in the database yet.
+        The new teams are created in order of appearance in names
+    '''
+    for name in dict.fromkeys(names):
+        if name not in teams:
+            teams[name] = Team.insert(name=name).execute()
+    return teams
+
+
+def player_ids():
+    '''
+        Map name -> id of all the players in the database
+    '''
+    return {name: id for id, name in Player.select(Player.id, Player.name).tuples()}
+
+
+def resolve_players(names, players):
+    '''
+        Add to the map players (name -> id) the normalized names that are not in the database yet.
+        Every name is inserted once, however many goals it scored
+    '''
+    new = [name for name in dict.fromkeys(names) if name not in players]
+    for batch in chunked(new, BATCH_SIZE):
+        Player.insert_many([(name,) for name in batch], fields=[Player.name]).execute()
+    if new:
+        players.update(Player.select(Player.name, Player.id).where(Player.name.in_(new)).tuples())
+    return players
+
+
+def parse_championship(year):
+    '''
+        Parse the json of the championship year/year+1 into the plain tuples of day_rows, one per match,
+        and the digests of the matchdays (number -> hash).
+        It does not touch the database, so it can run in a worker process
+    '''
+    rows, digests = [], {}
+    for day in iter_days(championship_path(year)):
+        rows.extend(day_rows(day))
+        digests[day.get("number")] = day_digest(day)
+    return year, rows, digests
+
+
+def write_matches(championship_id, rows, teams, batch_size=BATCH_SIZE, players=None):
+    '''
+        Insert the parsed rows of a championship, and their goals, in the current transaction.
+        The teams are resolved through the map teams (name -> id) and the matches
+        are written with insert_many, batch_size rows per statement (at most MAX_BATCH_SIZE)
+    '''
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size {batch_size} is not between 1 and {MAX_BATCH_SIZE}")
+    resolve_teams((name for row in rows for name in row[2:4]), teams)
+    values = [(championship_id, date, number, teams[team1], teams[team2], goals1, goals2,
+               *sorted((teams[team1], teams[team2])))
+              for number, date, team1, team2, goals1, goals2, scorers1, scorers2 in rows]
+    for batch in chunked(values, batch_size):
+        Match.insert_many(batch, fields=MATCH_FIELDS).execute()
+    write_goals(championship_id, rows, teams, players)
+    return len(values)
+
+
+def write_goals(championship_id, rows, teams, players=None):
+    '''
+        Insert the goals of the scorers lists of the parsed rows, whose matches are already in the database.
+        The matches are found by (number, home team), the players through the map players (name -> id)
+    '''
+    if players is None:
+        players = player_ids()
+    goals = [(number, teams[team], Player.parse(scorer))
+             for number, date, team1, team2, goals1, goals2, scorers1, scorers2 in rows
+             for team, scorers in ((team1, scorers1), (team2, scorers2)) for scorer in scorers]
+    if not goals:
+        return 0
+    resolve_players((name for number, team, (name, minute) in goals), players)
+    numbers = {row[0] for row in rows}
+    matches = {}
+    for id, number, team1, team2 in (Match.select(Match.id, Match.number, Match.team1, Match.team2)
+                                     .where((Match.championship == championship_id) & Match.number.in_(numbers))
+                                     .tuples()):
+        matches[number, team1] = matches[number, team2] = id
+    values = [(matches[number, team], championship_id, team, players[name], minute)
+              for number, team, (name, minute) in goals]
+    # a goal row is small and there are several per match: a single prepared statement beats insert_many
+    insert_rows(Goal, GOAL_FIELDS, values)
+    return len(values)
+
+
+def write_championship(year, rows, teams, batch_size=BATCH_SIZE, digests=None, players=None):
+    '''
+        Write the parsed rows, and the digests of the matchdays, of the championship year/year+1 in a single transaction.
+        The matchdays already in the database with the same digest are skipped and the others replace their
+        old matches: loading a season again only rewrites the matchdays that changed.
+        Without digests every matchday of rows is replaced
+    '''
+    with db.atomic():
+        dbchampionship, created = Championship.get_or_create(startyear=year)
+        if digests is None:
+            numbers, digests = {row[0] for row in rows}, {}
+        else:
+            committed = committed_digests(dbchampionship)
+            digests = {number: digest for number, digest in digests.items() if committed.get(number) != digest}
+            numbers = set(digests)
+        count = replace_days(dbchampionship, [row for row in rows if row[0] in numbers], numbers, digests,
+                             teams, batch_size, players)
+    print(f"Championship {dbchampionship} done ({len(numbers)} matchdays written).")
+    return count
 
 
 def load_championship(year):
     '''
-        Load all the games in the championship year/year+1 and saves it in the database
+        Load all the games in the championship year/year+1 and saves it in the database.
+        The matchdays already loaded with the same digest are skipped
     '''
     # Load the championship. If it does not exists creates it
     dbchampionship, created = Championship.get_or_create(startyear=year)
-    with open(f'data/championship{year}.json') as json_file:
-        days = json.load(json_file)
-    for day in days:
+    count, first = 0, None
+    # the matchdays loaded with the same digest are skipped, the changed ones replace their old matches
+    for day, digest in changed_days(dbchampionship, iter_days(championship_path(year))):
         n = day.get("number")
-        date = datetime.datetime(day['date']['year'],
-                                 day['date']['month'],
-                                 day['date']['day'])
+        date = day_date(day)
+        delete_days(dbchampionship, [n])
         for match in day['matches']:
             # Create a match
             dbmatch = Match(date=date, championship=dbchampionship, number=n)
             dbmatch.results_from_dict(match)
             dbmatch.save()
+            dbmatch.goals_from_dict(match)
+            count += 1
+        save_digests(dbchampionship.id, {n: digest})
+        first = n if first is None else min(first, n)
         print(f"{n}th day of championship {dbchampionship} done.")
+    if first is not None:
+        update_standings(dbchampionship, first)
+        update_ratings(dbchampionship)
+        bump_version(dbchampionship)
+    return count
+
+
+def load_championship_bulk(year, teams=None, players=None, batch_size=BATCH_SIZE):
+    '''
+        Load all the games in the championship year/year+1 in a single transaction.
+        The teams and the players are resolved once through the maps teams and players
+        (name -> id, read from the database if None) and the matches are written with insert_many,
+        batch_size rows per statement
+    '''
+    if teams is None:
+        teams = team_ids()
+    year, rows, digests = parse_championship(year)
+    return write_championship(year, rows, teams, batch_size, digests, players)
+
+
+def load_championships_parallel(years, workers=None, batch_size=BATCH_SIZE):
+    '''
+        Load the championships in years parsing the jsons in a pool of worker processes.
+        The main process is the only writer of the database: it drains the parsed seasons
+        in the order of years, so the team ids do not depend on which worker finishes first
+    '''
+    teams, players = team_ids(), player_ids()
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for year, rows, digests in pool.map(parse_championship, years):
+            count += write_championship(year, rows, teams, batch_size, digests, players)
+    return count
+
+
+def committed_digests(dbchampionship):
+    '''
+        Map number -> digest of the matchdays of the championship in the database
+    '''
+    return dict(Matchday.select(Matchday.number, Matchday.digest)
+                .where(Matchday.championship == dbchampionship).tuples())
+
+
+def changed_days(dbchampionship, days):
+    '''
+        Generator of the pairs (matchday dictionary, digest) of days that are not
+        in the database with the same digest
+    '''
+    committed = committed_digests(dbchampionship)
+    for day in days:
+        digest = day_digest(day)
+        if committed.get(day.get("number")) != digest:
+            yield day, digest
+
+
+def delete_days(dbchampionship, numbers):
+    '''
+        Delete the matches of the matchdays numbers of the championship, with their goals and ratings
+    '''
+    replaced = Match.select(Match.id).where((Match.championship == dbchampionship) & Match.number.in_(numbers))
+    Goal.delete().where(Goal.match.in_(replaced)).execute()
+    forget_ratings(replaced)
+    Match.delete().where((Match.championship == dbchampionship) & Match.number.in_(numbers)).execute()
+
+
+def replace_days(dbchampionship, rows, numbers, digests, teams, batch_size=BATCH_SIZE, players=None):
+    '''
+        Write the parsed rows of the matchdays numbers of the championship, and their digests, in the current
+        transaction. They replace the old matches, goals and ratings of those matchdays
+        and the standings and the ratings are updated from the first of them
+    '''
+    if not numbers:
+        return 0
+    delete_days(dbchampionship, list(numbers))
+    count = write_matches(dbchampionship.id, rows, teams, batch_size, players)
+    save_digests(dbchampionship.id, digests)
+    update_standings(dbchampionship, min(numbers))
+    update_ratings(dbchampionship)
+    bump_version(dbchampionship)
+    return count
+
+
+def write_days(dbchampionship, days, teams, batch_size=BATCH_SIZE, players=None):
+    '''
+        Write the pairs (matchday dictionary, digest) of changed_days in the current transaction.
+        The matchdays that changed replace their old matches, goals and ratings
+        and the standings and the ratings are updated from the first of them
+    '''
+    return replace_days(dbchampionship, [row for day, _ in days for row in day_rows(day)],
+                        [day.get("number") for day, _ in days], {day.get("number"): digest for day, digest in days},
+                        teams, batch_size, players)
+
+
+def stream_championship(year, teams=None, batch_days=BATCH_DAYS, batch_size=BATCH_SIZE, players=None):
+    '''
+        Load the championship year/year+1 streaming its matchdays from the file,
+        with a transaction every batch_days matchdays, so the memory does not depend on the size of the file.
+        The matchdays already in the database with the same digest are skipped: an interrupted load,
+        or a partial file, resumes from the last committed matchday and loading a season again
+        only rewrites the matchdays that changed
+    '''
+    if teams is None:
+        teams = team_ids()
+    if players is None:
+        players = player_ids()
+    dbchampionship, created = Championship.get_or_create(startyear=year)
+    count = 0
+    for batch in chunked(changed_days(dbchampionship, iter_days(championship_path(year))), batch_days):
+        with db.atomic():
+            count += write_days(dbchampionship, batch, teams, batch_size, players)
+        print(f"{len(batch)} days of championship {dbchampionship} committed.")
+    return count
+
+
+def rebuild_goals(year, teams, players):
+    '''
+        Replace the goals of the championship year/year+1 with the ones in its scraped file,
+        e.g. for a database loaded before the goals were stored.
+        A file whose matches are not in the database raises KeyError and rolls back the transaction:
+        the maps teams and players are updated only when the goals are written
+    '''
+    year, rows, digests = parse_championship(year)
+    new_teams, new_players = dict(teams), dict(players)
+    with db.atomic():
+        resolve_teams((name for row in rows for name in row[2:4]), new_teams)
+        dbchampionship = Championship.get(Championship.startyear == year)
+        Goal.delete().where(Goal.championship == dbchampionship).execute()
+        count = write_goals(dbchampionship.id, rows, new_teams, players=new_players)
+        bump_version(dbchampionship)
+    teams.update(new_teams)
+    players.update(new_players)
+    return count
+
+
+def rebuild_all_goals():
+    '''
+        Replace the goals of every championship in the database with rebuild_goals, as a map startyear -> goals
+        loaded. The championships without a scraped file, e.g. loaded by the DatabasePipeline, or with a file that
+        does not match their matches are skipped and reported: their goals are kept and their value is None
+    '''
+    teams, players = team_ids(), player_ids()
+    loaded = {}
+    for (year,) in Championship.select(Championship.startyear).order_by(Championship.startyear).tuples():
+        try:
+            loaded[year] = rebuild_goals(year, teams, players)
+            print(f"{loaded[year]} goals of championship {year} loaded.")
+        except FileNotFoundError:
+            loaded[year] = None
+            print(f"Championship {year} skipped: {championship_path(year)} does not exist.")
+        except KeyError as error:
+            loaded[year] = None
+            print(f"Championship {year} skipped: the match {error} (matchday, team id) of {championship_path(year)} "
+                  f"is not in the database.")
+    return loaded
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bulk', action='store_true',
+                        help='write every season in one transaction with insert_many')
+    parser.add_argument('--parallel', action='store_true',
+                        help='parse the seasons in a pool of processes, with a single writer')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the matchdays, committing every --batch-days, and skip the unchanged ones')
+    parser.add_argument('--batch-days', type=int, default=BATCH_DAYS,
+                        help='matchdays per transaction of --stream')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of parsing processes (default: number of CPUs)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'rows per INSERT statement, at most {MAX_BATCH_SIZE}')
+    parser.add_argument('--first', type=int, default=1986,
+                        help='first season to load')
+    parser.add_argument('--last', type=int, default=2020,
+                        help='last season to load')
+    parser.add_argument('--rebuild-standings', action='store_true',
+                        help='recompute the standings of every championship in the database and exit')
+    parser.add_argument('--rebuild-goals', action='store_true',
+                        help='reload the goals of the championships in the database from the scraped files and exit')
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH_SIZE}: "
+                     f"{len(MATCH_FIELDS)} columns per row and at most {MAX_VARIABLES} variables per statement")
+    years = range(args.first, args.last + 1)
+
     db.connect()
-    db.create_tables([Team, Championship, Match])
-    for i in range(1986, 2021):
-        load_championship(i)
+    db.create_tables([Team, Championship, Match, Player, Goal, Matchday, DataVersion, Standing, Rating])
+    if args.rebuild_goals:
+        loaded = rebuild_all_goals()
+        skipped = [year for year, count in loaded.items() if count is None]
+        if skipped:
+            print(f"{len(skipped)} championships skipped: {', '.join(map(str, skipped))}.")
+        raise SystemExit
+    if args.rebuild_standings:
+        for championship in Championship.select().order_by(Championship.startyear):
+            update_standings(championship)
+            print(f"Standings of championship {championship} rebuilt.")
+        raise SystemExit
+    start, count = time.perf_counter(), 0
+    if args.parallel:
+        count = load_championships_parallel(years, args.workers, args.batch_size)
+    else:
+        teams, players = team_ids(), player_ids()
+        for i in years:
+            if args.stream:
+                count += stream_championship(i, teams, args.batch_days, args.batch_size, players)
+            elif args.bulk:
+                count += load_championship_bulk(i, teams, players, args.batch_size)
+            else:
+                count += load_championship(i)
+    elapsed = time.perf_counter() - start
+    print(f"{count} matches loaded in {elapsed:.2f}s ({count / elapsed:.0f} rows/s).")
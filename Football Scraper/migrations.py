@@ -0,0 +1,162 @@
+'''
+Module that brings an existing database to the current schema of the models:
+merges the duplicated teams, championships and matches that violate the unique indexes,
+then creates the missing tables and indexes. Default `data/serieA.db`
+    python migrations.py [--check]
+'''
+
+from models import Match, Matchday, Team, Championship, Standing, Player, Goal, DataVersion, Rating, db
+from models import bump_version, update_standings
+from ratings import rebuild_ratings, update_ratings
+from peewee import IntegerField, fn
+from playhouse.migrate import SqliteMigrator, migrate as apply_migrations
+import argparse
+import datetime
+
+MODELS = [Team, Championship, Match, Player, Goal, Matchday, DataVersion, Standing, Rating]
+
+
+def merge_duplicates(model, field, references):
+    '''
+        Keep only the row with the lowest id for each value of field,
+        pointing the foreign keys in references to it. Returns the number of removed rows
+    '''
+    duplicates = (model.select(field, fn.MIN(model.id), fn.GROUP_CONCAT(model.id))
+                  .group_by(field).having(fn.COUNT(model.id) > 1).tuples())
+    removed = 0
+    for value, keep, ids in duplicates:
+        extra = [int(id) for id in ids.split(',') if int(id) != keep]
+        for reference in references:
+            reference.model.update({reference: keep}).where(reference.in_(extra)).execute()
+        removed += model.delete().where(model.id.in_(extra)).execute()
+        print(f"Merged {len(extra)} duplicates of {model.__name__} {value}.")
+    return removed
+
+
+def merge_duplicated_matches():
+    '''
+        Remove the matches loaded more than once, e.g. running jsontodb twice before the loaders skipped the
+        loaded matchdays: the matches with the same key (championship, number, team1) of the unique index
+    '''
+    keep = (Match.select(fn.MIN(Match.id))
+            .group_by(Match.championship, Match.number, Match.team1))
+    if Goal.table_exists():
+        Goal.delete().where(Goal.match.not_in(keep)).execute()
+    removed = Match.delete().where(Match.id.not_in(keep)).execute()
+    if removed:
+        print(f"Removed {removed} duplicated matches.")
+    return removed
+
+
+def add_pair_key(refill=False):
+    '''
+        Add the unordered pair key (pairlow, pairhigh) of the matches if it is missing and fill it.
+        With refill it is filled again even if it exists, e.g. after merging teams
+    '''
+    columns = [column.name for column in db.get_columns('match')]
+    if 'pairlow' not in columns:
+        migrator = SqliteMigrator(db)
+        apply_migrations(migrator.add_column('match', 'pairlow', IntegerField(default=0)),
+                         migrator.add_column('match', 'pairhigh', IntegerField(default=0)))
+        print("Added the pair key to the matches.")
+    elif not refill:
+        return
+    Match.update(pairlow=fn.MIN(Match.team1, Match.team2),
+                 pairhigh=fn.MAX(Match.team1, Match.team2)).execute()
+
+
+def migrate():
+    '''
+        Merge the duplicates, create the missing tables and indexes and rate the matches not rated yet
+    '''
+    with db.atomic():
+        existing = db.get_tables()
+        removed = 0
+        if 'team' in existing:
+            removed += merge_duplicates(Team, Team.name, [Match.team1, Match.team2] +
+                                        ([Goal.team] if 'goal' in existing else []))
+        if 'championship' in existing:
+            removed += merge_duplicates(Championship, Championship.startyear, [Match.championship] +
+                                        ([Goal.championship] if 'goal' in existing else []))
+        if 'match' in existing:
+            removed += merge_duplicated_matches()
+            add_pair_key(refill=removed > 0)
+        # create_tables issues CREATE TABLE/INDEX IF NOT EXISTS, so it only adds what is missing
+        db.create_tables(MODELS)
+        if removed:
+            for championship in Championship.select():
+                update_standings(championship)
+            bump_version(*Championship.select())
+        # merged teams and removed matches change the whole history of the ratings
+        if removed:
+            rebuild_ratings()
+        else:
+            update_ratings()
+    # statistics of the indexes for the query planner
+    db.execute_sql('ANALYZE')
+
+
+def query_plans():
+    '''
+        SQLite query plans of the hot queries, as a dictionary name -> list of plan details
+    '''
+    team = Team.select().get()
+    other = Team.select().where(Team.id != team.id).get()
+    championship = Championship.select().get()
+    queries = {
+        'team by name': Team.select().where(Team.name == team.name),
+        'championship by startyear': Championship.select().where(Championship.startyear == championship.startyear),
+        'matches of a team in a season': Match.select().where(
+            (Match.championship == championship) & ((Match.team1 == team) | (Match.team2 == team))),
+        'head-to-head': Match.select().where(((Match.team1 == team) & (Match.team2 == other)) |
+                                             ((Match.team2 == team) & (Match.team1 == other))),
+        'head-to-head by pair key': Match.select().where(
+            (Match.pairlow == min(team.id, other.id)) & (Match.pairhigh == max(team.id, other.id))),
+        'goals of a season by player': Goal.select(Goal.player, fn.COUNT(Goal.id))
+            .where(Goal.championship == championship).group_by(Goal.player),
+        'goals of a player by season': Goal.select(Goal.championship, fn.COUNT(Goal.id))
+            .where(Goal.player == 1).group_by(Goal.championship),
+        'rating of a team at a date': Rating.select(Rating.post).where(
+            (Rating.team == team) & (Rating.date <= datetime.date(2000, 1, 1)))
+            .order_by(Rating.date.desc(), Rating.match.desc()).limit(1),
+        'matches from a date': Match.select().where(Match.date >= datetime.date(2000, 1, 1)),
+    }
+    plans = {}
+    for name, query in queries.items():
+        sql, params = query.sql()
+        plans[name] = [row[-1] for row in db.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)]
+    return plans
+
+
+def uses_indexes(details):
+    '''
+        True if every table of a query plan is read through an index
+    '''
+    return all('USING' in detail and 'INDEX' in detail
+               for detail in details if detail.startswith(('SCAN', 'SEARCH')))
+
+
+def check_query_plans():
+    '''
+        Print the query plans of the hot queries and return False if any of them scans a whole table
+    '''
+    ok = True
+    for name, details in query_plans().items():
+        indexed = uses_indexes(details)
+        ok = ok and indexed
+        print(f"{'ok' if indexed else 'FULL SCAN'}: {name}")
+        for detail in details:
+            print(f"    {detail}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true',
+                        help='after the migration check that the hot queries use the indexes')
+    args = parser.parse_args()
+
+    db.connect()
+    migrate()
+    if args.check and not check_query_plans():
+        raise SystemExit(1)
@@ -3,11 +3,70 @@ Module that defines the models to interface the peewee ORM with the SQLite datab
 '''
 
 from peewee import IntegerField, SqliteDatabase, Model
-from peewee import CharField, DateField, ForeignKeyField
+from peewee import CharField, DateField, FloatField, ForeignKeyField
+from peewee import Case, OperationalError, SQL, fn
+from itertools import groupby
+import os
+import re
+
+import cache
+from rules import Rules, results_record, season_points, season_rules
+
+
+# Path of the database, overridden by the environment variable SERIEA_DATABASE
+DATABASE = os.environ.get('SERIEA_DATABASE', 'data/serieA.db')
+# Connections of each thread, 0 for one connection per thread, overridden by SERIEA_POOL
+POOL = int(os.environ.get('SERIEA_POOL', 0))
+# Settings of every connection. In WAL mode the readers do not block the ingest and the ingest does not block
+# the readers: a single writer at a time, the others wait up to busy_timeout milliseconds
+PRAGMAS = {'journal_mode': os.environ.get('SERIEA_JOURNAL_MODE', 'wal'),
+           'synchronous': 'normal',
+           'busy_timeout': 30000,
+           'cache_size': -64 * 1024,  # KiB
+           'mmap_size': 256 * 1024 * 1024,
+           'temp_store': 'memory'}
+
+
+def open_database(path=DATABASE, pool=POOL, **pragmas):
+    '''
+    sqlite database in path with the PRAGMAS, updated with pragmas.
+    Each thread opens its own connection; with pool > 0 the threads share a pool of at most pool connections,
+    returned to the pool by db.close() (or at the end of a db.connection_context() block)
+    '''
+    pragmas = dict(PRAGMAS, **pragmas)
+    if pool:
+        from playhouse.pool import PooledSqliteDatabase
+        return PooledSqliteDatabase(path, pragmas=pragmas, max_connections=pool, stale_timeout=300)
+    return SqliteDatabase(path, pragmas=pragmas)
+
+
+def init_database(path, **pragmas):
+    '''
+    Point the main database to the file in path, with the PRAGMAS updated with pragmas.
+    The models keep using the main database
+    '''
+    db.init(path, pragmas=dict(PRAGMAS, **pragmas))
 
 
 # Main database
-db = SqliteDatabase('data/serieA.db')
+db = open_database()
+
+
+def database_path():
+    '''
+    Absolute path of the main database, None for an in-memory or not initialized database
+    '''
+    if db.database in (None, '', ':memory:'):
+        return None
+    return os.path.abspath(db.database)
+
+
+def cached(version):
+    '''
+    cache.cached with the path of the main database in the keys: the results of two databases,
+    or of the database before and after init_database, are kept apart
+    '''
+    return cache.cached(version, scope=database_path)
 
 
 class Team(Model):
@@ -16,17 +75,49 @@ class Team(Model):
         name: name of the team
 
         team_matches_all() queryset of all the matches of the team
+        matches() queryset of all the matches of the team, with both teams loaded in the same query
+        head_to_head(other, seasons=None) stats of the team and of other in the matches between them,
+            optionally only in the championships starting in the years seasons
+        season_timeline(start=None, end=None) stats and final ranking of the team in every championship
+            it played starting from start to end, computed with the queries of season_rankings and sorted in Python
+            with the rules of each season
     '''
 
     class Meta:
         database = db  # This model uses the "people.db" database.
 
-    name = CharField()
+    name = CharField(unique=True)
 
     def team_matches_all(self):
         return (self.team_matches_home +
                 self.team_matches_guest).order_by(Match.date)
 
+    def matches(self):
+        return (Match.with_teams()
+                .where((Match.team1 == self) | (Match.team2 == self))
+                .order_by(Match.date))
+
+    @cached(lambda *args, **kwargs: data_version())
+    def head_to_head(self, other, seasons=None):
+        low, high = sorted((self.id, other.id))
+        matrix = head_to_head_matrix(seasons, (Match.pairlow == low) & (Match.pairhigh == high))
+        return [matrix.get((self.id, other.id), make_results(self.name, 0, 0, 0, 0, 0, 0, 0)),
+                matrix.get((other.id, self.id), make_results(other.name, 0, 0, 0, 0, 0, 0, 0))]
+
+    @cached(lambda *args, **kwargs: data_version())
+    def season_timeline(self, start=None, end=None):
+        played = Match.select(Match.championship).where((Match.team1 == self) | (Match.team2 == self))
+        if start is not None or end is not None:
+            played = played.join(Championship).where(
+                Championship.startyear.between(start if start is not None else 0,
+                                               end if end is not None else 9999))
+        timeline = []
+        for year, ranking in season_rankings(Match.championship.in_(played)).items():
+            position, results = next((position, results) for position, results in enumerate(ranking, 1)
+                                     if results['team'] == self.name)
+            timeline.append(dict(zip(TIMELINE_KEYS, (year, *[results[key] for key in RESULTS_KEYS[1:]], position))))
+        return timeline
+
     def __str__(self):
         return self.name
 
@@ -37,46 +128,69 @@ class Championship(Model):
         startyear: year when the championship started
         endyear: year when the championship ended
         playing_teams: queryset of teams that took part to the championship
-        compute_ranking(): queryset of the stats of every team that took part in the championship
+        rules: scoring rules and tiebreakers of the championship
+        compute_ranking(): list of the stats of every team that took part in the championship
+        ranking(): list of the stats of every team sorted by points and tiebreakers, computed with two queries
+        top_scorers(limit=10): list of the players with most goals in the championship
     '''
 
     class Meta:
         database = db  # This model uses the "people.db" database.
 
-    startyear = IntegerField()
+    startyear = IntegerField(unique=True)
 
     @property
     def endyear(self):
         return self.startyear + 1
 
+    @property
+    def rules(self):
+        return season_rules(self.startyear)
+
     @property
     def playing_teams(self):
         return Team.select().join(Match, on=(Match.team1 == Team.id)).where(
             Match.championship == self).distinct()
 
+    @cached(lambda championship, *args, **kwargs: data_version(championship))
     def compute_ranking(self):
-        for team in self.playing_teams:
-            played_matches = self.championship_matches.where(
-                (Match.team1 == team) | (Match.team2 == team))
-            yield get_results(team, played_matches)
+        return [get_results(team, self.championship_matches.where((Match.team1 == team) | (Match.team2 == team)),
+                            self.rules)
+                for team in self.playing_teams]
+
+    @cached(lambda championship, *args, **kwargs: data_version(championship))
+    def ranking(self):
+        return season_rankings(Match.championship == self).get(self.startyear, [])
+
+    @cached(lambda championship, *args, **kwargs: data_version(championship))
+    def top_scorers(self, limit=10):
+        return list(Player.select(Player.name.alias('player'), fn.COUNT(Goal.id).alias('goals'))
+                    .join(Goal, on=(Goal.player == Player.id))
+                    .where(Goal.championship == self)
+                    .group_by(Player.id)
+                    .order_by(SQL('goals').desc(), Player.name)
+                    .limit(limit)
+                    .dicts())
 
     def __str__(self):
         return f"{self.startyear}-{self.endyear % 100}"
 
 
-def get_results(team, played_matches):
+def get_results(team, played_matches, rules=None):
     '''
-    stats of the team in the played_matches
+    stats of the team in the played_matches, with the points of rules (3 for a win and 1 for a draw if None)
     '''
-    points, wins, even, scored, taken = 0, 0, 0, 0, 0
+    if rules is None:
+        rules = Rules()
+    # Compare the ids of the teams: it does not load the related Team rows
+    wins, even, scored, taken = 0, 0, 0, 0
     for m in played_matches:
-        if m.winner == team:
-            points += 3
+        winner = m.winner_id
+        if winner == team.id:
             wins += 1
-        if m.winner is None:
-            points += 1
+        if winner is None:
             even += 1
-        if m.team1 == team:
+        if m.team1_id == team.id:
             scored += m.team1goals
             taken += m.team2goals
         else:
@@ -84,7 +198,7 @@ def get_results(team, played_matches):
             scored += m.team2goals
 
     return {'team': team.name,
-            'points': points,
+            'points': rules.points(wins, even, len(played_matches) - wins - even),
             'played': len(played_matches),
             'won': wins,
             'even': even,
@@ -93,6 +207,131 @@ def get_results(team, played_matches):
             'taken': taken}
 
 
+# Keys of the stats of a team, in the order returned by get_results
+RESULTS_KEYS = ('team', 'points', 'played', 'won', 'even', 'lost', 'scored', 'taken')
+
+
+def team_rows(condition=None):
+    '''
+    subquery with one row (championship, team, opponent, scored, taken) for each team in each match
+    satisfying condition: the home rows followed by the guest rows
+    '''
+    home = Match.select(Match.championship.alias('championship'), Match.team1.alias('team'), Match.team2.alias('opponent'),
+                        Match.team1goals.alias('scored'), Match.team2goals.alias('taken'))
+    guest = Match.select(Match.championship.alias('championship'), Match.team2.alias('team'), Match.team1.alias('opponent'),
+                         Match.team2goals.alias('scored'), Match.team1goals.alias('taken'))
+    if condition is not None:
+        home, guest = home.where(condition), guest.where(condition)
+    return (home + guest).alias('rows')
+
+
+# Keys of the stats of a team in a season, in the order returned by Team.season_timeline
+TIMELINE_KEYS = ('year',) + RESULTS_KEYS[1:] + ('ranking',)
+
+
+def make_results(team, points, played, won, even, lost, scored, taken):
+    '''
+    stats of a team with the keys of RESULTS_KEYS
+    '''
+    return {'team': team,
+            'points': points,
+            'played': played,
+            'won': won,
+            'even': even,
+            'lost': lost,
+            'scored': scored,
+            'taken': taken}
+
+
+def seasons_condition(seasons):
+    '''
+    condition on the matches of the championships starting in the years seasons
+    '''
+    return Match.championship.in_(
+        Championship.select(Championship.id).where(Championship.startyear.in_(list(seasons))))
+
+
+def head_to_head_matrix(seasons=None, condition=None, by_season=False):
+    '''
+    stats of every team against every opponent it played, as a dictionary (team id, opponent id) -> stats
+    with the keys of RESULTS_KEYS. It is a single query grouped by the unordered pair of teams
+    (Match.pairlow, Match.pairhigh), optionally restricted to the championships starting in the years seasons
+    and to the matches satisfying condition. The points follow the rules of the season of each match.
+    With by_season the stats are split by championship and the keys are (startyear, team id, opponent id)
+    '''
+    low, high = Team.alias(), Team.alias()
+    home_is_low = Match.team1 == Match.pairlow
+    low_scored = Case(None, [(home_is_low, Match.team1goals)], Match.team2goals)
+    low_taken = Case(None, [(home_is_low, Match.team2goals)], Match.team1goals)
+    win, even, loss = (season_points(Championship.startyear, result) for result in ('win', 'even', 'loss'))
+    season = [Championship.startyear] if by_season else []
+    query = (Match.select(*season, Match.pairlow, Match.pairhigh, low.name, high.name,
+                          fn.SUM(Case(None, [(low_scored > low_taken, win), (low_scored == low_taken, even)], loss)),
+                          fn.SUM(Case(None, [(low_scored < low_taken, win), (low_scored == low_taken, even)], loss)),
+                          fn.COUNT(Match.id),
+                          fn.SUM(Case(None, [(low_scored > low_taken, 1)], 0)),
+                          fn.SUM(Case(None, [(low_scored == low_taken, 1)], 0)),
+                          fn.SUM(Case(None, [(low_scored < low_taken, 1)], 0)),
+                          fn.SUM(low_scored), fn.SUM(low_taken))
+             .join_from(Match, Championship)
+             .join_from(Match, low, on=(Match.pairlow == low.id))
+             .join_from(Match, high, on=(Match.pairhigh == high.id))
+             .group_by(*season, Match.pairlow, Match.pairhigh))
+    if seasons is not None:
+        query = query.where(seasons_condition(seasons))
+    if condition is not None:
+        query = query.where(condition)
+    matrix = {}
+    for row in query.tuples():
+        key = row[:len(season)]
+        lowid, highid, lowname, highname, lowpoints, highpoints, played, won, even, lost, scored, taken = row[len(key):]
+        matrix[key + (lowid, highid)] = make_results(lowname, lowpoints, played, won, even, lost, scored, taken)
+        matrix[key + (highid, lowid)] = make_results(highname, highpoints, played, lost, even, won, taken, scored)
+    return matrix
+
+
+def aggregate_results(rows):
+    '''
+    query of the stats of every team in the team_rows subquery rows, with the columns of RESULTS_KEYS.
+    The points follow the rules of the season of each row
+    '''
+    win, even, loss = (season_points(Championship.startyear, result) for result in ('win', 'even', 'loss'))
+    return (Team.select(Team.name.alias('team'),
+                        fn.SUM(Case(None, [(rows.c.scored > rows.c.taken, win),
+                                           (rows.c.scored == rows.c.taken, even)], loss)).alias('points'),
+                        fn.COUNT(SQL('*')).alias('played'),
+                        fn.SUM(Case(None, [(rows.c.scored > rows.c.taken, 1)], 0)).alias('won'),
+                        fn.SUM(Case(None, [(rows.c.scored == rows.c.taken, 1)], 0)).alias('even'),
+                        fn.SUM(Case(None, [(rows.c.scored < rows.c.taken, 1)], 0)).alias('lost'),
+                        fn.SUM(rows.c.scored).alias('scored'),
+                        fn.SUM(rows.c.taken).alias('taken'))
+            .join(rows, on=(rows.c.team == Team.id))
+            .join_from(rows, Championship, on=(rows.c.championship == Championship.id))
+            .group_by(Team.id))
+
+
+def season_rankings(condition=None):
+    '''
+    final ranking of every championship in the matches satisfying condition, sorted with the rules of its season,
+    as a dictionary startyear -> list of stats with the keys of RESULTS_KEYS. Two queries: the stats of every team
+    in every championship and the head to head matrix of every championship, which resolves the tiebreakers
+    '''
+    rows = team_rows(condition)
+    query = (aggregate_results(rows)
+             .select_extend(Championship.startyear, Team.id)
+             .group_by(Championship.startyear, Team.id)
+             .order_by(Championship.startyear, Team.id))
+    head_to_head = {}
+    for (year, team, opponent), results in head_to_head_matrix(condition=condition, by_season=True).items():
+        head_to_head.setdefault(year, {})[team, opponent] = results
+    rankings = {}
+    for year, season in groupby(query.tuples(), key=lambda row: row[-2]):
+        stats = {row[-1]: dict(zip(RESULTS_KEYS, row)) for row in season}
+        order = season_rules(year).order(stats, results_record(stats, head_to_head.get(year, {})))
+        rankings[year] = [stats[team] for team in order]
+    return rankings
+
+
 class Match(Model):
     '''
     Model that represent a match.
@@ -101,24 +340,38 @@ class Match(Model):
         number: number of the game relative of the championship
         team1/team2: teams that took part in the match. team1 is the home team, team2 is the guest team
         team1goals/team2goals: number of goals scored by team1/2
+        pairlow/pairhigh: lowest and highest id of team1 and team2, the key of the matches between two teams
 
         winner: team that won the match, None if it is a draw
+        winner_id: id of the team that won the match, None if it is a draw. It does not query the Team table
         results_from_dict(dictionary): method to load the detail of the match from a dictionary
+        goals_from_dict(dictionary): method to save the goals of the saved match from the scorers in a dictionary
+        with_teams(): queryset of the matches that loads team1 and team2 in the same query
 
     '''
 
     class Meta:
         database = db  # This model uses the "people.db" database.
+        # a team plays once in a matchday, so a championship is never loaded twice.
+        # Matches of a team in a championship, head-to-head matches of two teams and matches from a date on.
+        # They also cover the championship and team1 foreign keys, which do not need their own index
+        indexes = ((('championship', 'number', 'team1'), True),
+                   (('championship', 'team1'), False),
+                   (('championship', 'team2'), False),
+                   (('team1', 'team2', 'date'), False),
+                   (('pairlow', 'pairhigh', 'date'), False),
+                   (('date',), False))
 
     championship = ForeignKeyField(
-        Championship, backref='championship_matches')
+        Championship, backref='championship_matches', index=False)
     date = DateField()
     number = IntegerField()
-    team1 = ForeignKeyField(Team, backref='team_matches_home')
+    team1 = ForeignKeyField(Team, backref='team_matches_home', index=False)
     team2 = ForeignKeyField(Team, backref='team_matches_guest')
     team1goals = IntegerField()
     team2goals = IntegerField()
-    # TODO: add JSON field with the scorers
+    pairlow = IntegerField()
+    pairhigh = IntegerField()
 
     @property
     def winner(self):
@@ -129,6 +382,22 @@ class Match(Model):
         if self.team1goals > self.team2goals:
             return self.team1
 
+    @property
+    def winner_id(self):
+        if self.team1goals < self.team2goals:
+            return self.team2_id
+        if self.team1goals == self.team2goals:
+            return None
+        if self.team1goals > self.team2goals:
+            return self.team1_id
+
+    @classmethod
+    def with_teams(cls):
+        home, guest = Team.alias(), Team.alias()
+        return (cls.select(cls, home, guest)
+                .join_from(cls, home, on=cls.team1)
+                .join_from(cls, guest, on=cls.team2))
+
     def results_from_dict(self, dictionary):
         # Create the teams if they don't exists
         team1, _ = Team.get_or_create(
@@ -140,13 +409,398 @@ class Match(Model):
         self.team2 = team2
         self.team2goals = dictionary["team2"]["goals"]
 
+    def goals_from_dict(self, dictionary):
+        for key, team in (("team1", self.team1_id), ("team2", self.team2_id)):
+            for scorer in dictionary[key].get("scorers", []):
+                name, minute = Player.parse(scorer)
+                player, _ = Player.get_or_create(name=name)
+                Goal.create(match=self, championship=self.championship_id, team=team,
+                            player=player, minute=minute)
+
+    def save(self, *args, **kwargs):
+        self.pairlow, self.pairhigh = sorted((self.team1_id, self.team2_id))
+        result = super().save(*args, **kwargs)
+        bump_version(self.championship_id)
+        return result
+
+    def delete_instance(self, *args, **kwargs):
+        result = super().delete_instance(*args, **kwargs)
+        bump_version(self.championship_id)
+        return result
+
     def __str__(self):
         return f"{self.team1} vs {self.team2} the {self.date.day}/{self.date.month}/{self.date.year}"
 
 
+class Player(Model):
+    '''
+    Model that represent a player that scored in a match.
+        name: normalized name of the player, as written in the list of the scorers
+
+        parse(scorer): normalized name and minute (None if missing) of an entry of the list of the scorers
+        career(): list of the goals of the player in every championship and team
+    '''
+
+    class Meta:
+        database = db
+
+    name = CharField(unique=True)
+
+    @staticmethod
+    def parse(scorer):
+        match = SCORER_MINUTE.search(scorer)
+        if match is None:
+            return ' '.join(scorer.split()), None
+        return ' '.join(scorer[:match.start()].split()), int(match.group(1))
+
+    @cached(lambda *args, **kwargs: data_version())
+    def career(self):
+        return list(Goal.select(Championship.startyear, Team.name.alias('team'), fn.COUNT(Goal.id).alias('goals'))
+                    .join_from(Goal, Championship)
+                    .join_from(Goal, Team)
+                    .where(Goal.player == self)
+                    .group_by(Goal.championship, Goal.team)
+                    .order_by(Championship.startyear)
+                    .dicts())
+
+    def __str__(self):
+        return self.name
+
+
+# Minute at the end of an entry of the scorers, e.g. "Rossi 45'" or "Rossi 90+2'"
+SCORER_MINUTE = re.compile(r"\s(\d{1,3})(?:\s*\+\s*\d{1,2})?\s*'?\s*(?:\(.*\))?\s*$")
+
+
+class Goal(Model):
+    '''
+    Model that represent a goal.
+        match: the goal was scored in this match
+        championship: championship of the match, to group the goals by season without joining the matches
+        team: team of the scorer
+        player: the scorer
+        minute: minute of the goal, None if it is not in the list of the scorers
+    '''
+
+    class Meta:
+        database = db
+        # top scorers of a championship and career of a player
+        indexes = ((('championship', 'player'), False),
+                   (('player', 'championship'), False))
+
+    match = ForeignKeyField(Match, backref='goals')
+    championship = ForeignKeyField(Championship, backref='goals', index=False)
+    team = ForeignKeyField(Team, backref='goals')
+    player = ForeignKeyField(Player, backref='goals', index=False)
+    minute = IntegerField(null=True)
+
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        bump_version(self.championship_id)
+        return result
+
+    def delete_instance(self, *args, **kwargs):
+        result = super().delete_instance(*args, **kwargs)
+        bump_version(self.championship_id)
+        return result
+
+
+class Matchday(Model):
+    '''
+    Model that represent a matchday loaded in the database.
+        championship/number: key of the matchday
+        digest: hash of the scraped dictionary of the matchday, to skip it when it is loaded again unchanged
+    '''
+
+    class Meta:
+        database = db
+        indexes = ((('championship', 'number'), True),)
+
+    championship = ForeignKeyField(Championship, backref='matchdays')
+    number = IntegerField()
+    digest = CharField()
+
+
+class DataVersion(Model):
+    '''
+    Model that represent the version of the data of a championship.
+        championship: the championship, one row each
+        version: value of a counter, increased by every ingest, when the matches of the championship were last written
+
+    The results of the cached methods (see cache.py) are valid as long as the versions they depend on do not change
+    '''
+
+    class Meta:
+        database = db
+
+    championship = ForeignKeyField(Championship, unique=True, backref='versions')
+    version = IntegerField()
+
+
+class Rating(Model):
+    '''
+    Model that represent the Elo rating of a team in a match (see ratings.py).
+        match: the rated match, two ratings each
+        team: the rated team
+        date: date of the match, to look up the rating of a team at a date
+        pre/post: rating of the team before and after the match
+    '''
+
+    class Meta:
+        database = db
+        # rating of a team at a date, and the ratings from a date on, replaced by an update
+        indexes = ((('team', 'date', 'match'), True),
+                   (('date',), False))
+
+    match = ForeignKeyField(Match, backref='ratings')
+    team = ForeignKeyField(Team, backref='ratings', index=False)
+    date = DateField()
+    pre = FloatField()
+    post = FloatField()
+
+
+def bump_version(*championships):
+    '''
+    Mark the data of the championships as changed, invalidating the cached results that depend on them.
+    Called by every ingest after writing matches and by the save and delete_instance of a Match or a Goal.
+    Does nothing on a database without the versions, whose results are never cached
+    '''
+    try:
+        version = (DataVersion.select(fn.MAX(DataVersion.version)).scalar() or 0) + 1
+    except OperationalError:
+        return None
+    (DataVersion.insert_many([(getattr(championship, 'id', championship), version) for championship in championships],
+                             fields=[DataVersion.championship, DataVersion.version])
+     .on_conflict_replace().execute())
+    return version
+
+
+def data_version(championship=None):
+    '''
+    Version of the data of the championship, or of the whole database if None.
+    0 if the database has no versions yet, e.g. before the first ingest, and None if it has no versions table:
+    its results are not cached, since nothing would invalidate them
+    '''
+    query = DataVersion.select(fn.MAX(DataVersion.version))
+    if championship is not None:
+        query = query.where(DataVersion.championship == championship)
+    try:
+        return query.scalar() or 0
+    except OperationalError:
+        return None
+
+
+def load_matches_frame(seasons=None, teams=None):
+    '''
+    pandas DataFrame of the matches, read with a cursor straight into typed NumPy arrays without building the models.
+    Columns: season, number, date (datetime64), team1/team2 (categorical of the team names), team1goals/team2goals (int8).
+    Optionally only the championships starting in the years seasons and the matches of the teams (models or ids)
+    '''
+    import numpy as np
+    import pandas as pd
+
+    query = (Match.select(Championship.startyear, Match.number, Match.date, Match.team1, Match.team2,
+                          Match.team1goals, Match.team2goals)
+             .join(Championship)
+             .order_by(Match.date, Match.id))
+    if seasons is not None:
+        query = query.where(Championship.startyear.in_(list(seasons)))
+    if teams is not None:
+        teams = [getattr(team, 'id', team) for team in teams]
+        query = query.where(Match.team1.in_(teams) | Match.team2.in_(teams))
+    columns = list(zip(*db.execute(query).fetchall())) or [()] * 7
+    # the team ids index the categories: code i is the team with the i-th smallest id
+    ids, names = zip(*Team.select(Team.id, Team.name).order_by(Team.id).tuples()) or ((), ())
+    codes = np.full(max(ids, default=0) + 1, -1, dtype=np.int16)
+    codes[list(ids)] = np.arange(len(ids))
+    categories = pd.Index(names, dtype=object)
+    return pd.DataFrame({
+        'season': np.array(columns[0], dtype=np.int16),
+        'number': np.array(columns[1], dtype=np.int8),
+        'date': np.array(columns[2], dtype='datetime64[D]'),
+        'team1': pd.Categorical.from_codes(codes[np.array(columns[3], dtype=np.int64)], categories),
+        'team2': pd.Categorical.from_codes(codes[np.array(columns[4], dtype=np.int64)], categories),
+        'team1goals': np.array(columns[5], dtype=np.int8),
+        'team2goals': np.array(columns[6], dtype=np.int8)})
+
+
+def frame_team_rows(frame):
+    '''
+    DataFrame with one row (season, team, opponent, scored, taken, won, even, lost, points) for each team
+    in each match of frame. The points follow the rules of the season
+    '''
+    import pandas as pd
+
+    home = pd.DataFrame({'season': frame['season'], 'team': frame['team1'], 'opponent': frame['team2'],
+                         'scored': frame['team1goals'], 'taken': frame['team2goals']})
+    guest = pd.DataFrame({'season': frame['season'], 'team': frame['team2'], 'opponent': frame['team1'],
+                          'scored': frame['team2goals'], 'taken': frame['team1goals']})
+    rows = pd.concat([home, guest], ignore_index=True)
+    rows['won'] = rows['scored'] > rows['taken']
+    rows['even'] = rows['scored'] == rows['taken']
+    rows['lost'] = rows['scored'] < rows['taken']
+    rules = {season: season_rules(season) for season in rows['season'].unique().tolist()}
+    points = {result: rows['season'].map({season: getattr(rule, result) for season, rule in rules.items()})
+              for result in ('win', 'even', 'loss')}
+    rows['points'] = (rows['won'] * points['win'] + rows['even'] * points['even'] +
+                      rows['lost'] * points['loss']).astype('int16')
+    return rows
+
+
+def frame_aggregate(rows, by):
+    '''
+    stats with the columns of RESULTS_KEYS of the team rows of frame_team_rows grouped by the columns by
+    '''
+    stats = rows.groupby(by, observed=True).agg(
+        points=('points', 'sum'), played=('scored', 'size'), won=('won', 'sum'), even=('even', 'sum'),
+        lost=('lost', 'sum'), scored=('scored', 'sum'), taken=('taken', 'sum'))
+    return stats.reset_index()
+
+
+def frame_results(frame, team):
+    '''
+    stats of the team (name) in the matches of frame, like get_results with the rules of the season of each match
+    '''
+    rows = frame_team_rows(frame[(frame['team1'] == team) | (frame['team2'] == team)])
+    rows = rows[rows['team'] == team]
+    return {'team': team,
+            'points': int(rows['points'].sum()),
+            'played': len(rows),
+            'won': int(rows['won'].sum()),
+            'even': int(rows['even'].sum()),
+            'lost': int(rows['lost'].sum()),
+            'scored': int(rows['scored'].sum()),
+            'taken': int(rows['taken'].sum())}
+
+
+def frame_ranking(frame):
+    '''
+    final ranking of every season in the matches of frame, like Championship.ranking:
+    DataFrame with the season and the columns of RESULTS_KEYS, sorted by season and position
+    '''
+    import pandas as pd
+
+    rows = frame_team_rows(frame)
+    stats = frame_aggregate(rows, ['season', 'team'])
+    matrix = frame_aggregate(rows, ['season', 'team', 'opponent'])
+    ordered = []
+    for season, table in stats.groupby('season', sort=True):
+        # the categories of the teams are sorted by id, as the ties of season_rankings
+        table = table.sort_values('team', key=lambda teams: teams.cat.codes).set_index('team', drop=False)
+        versus = matrix[matrix['season'] == season].set_index(['team', 'opponent'])
+        season_stats = table.to_dict('index')
+        head_to_head = versus.to_dict('index')
+        order = season_rules(season).order(season_stats, results_record(season_stats, head_to_head))
+        ordered.append(table.loc[order])
+    if not ordered:
+        return stats
+    return pd.concat(ordered).reset_index(drop=True)
+
+
+class Standing(Model):
+    '''
+    Model that represent the standing of a team in a championship after a matchday.
+        championship/team/matchday: key of the standing. matchday is the number of the game of the championship
+        position: position of the team in the ranking after the matchday
+        points/played/won/even/lost/scored/taken: cumulative stats of the team up to the matchday
+
+        get_position(team, year, matchday): position of the team in the championship year after the matchday
+    '''
+
+    class Meta:
+        database = db
+        indexes = ((('championship', 'team', 'matchday'), True),
+                   (('championship', 'matchday', 'position'), False))
+
+    championship = ForeignKeyField(Championship, backref='standings')
+    team = ForeignKeyField(Team, backref='standings')
+    matchday = IntegerField()
+    position = IntegerField()
+    points = IntegerField()
+    played = IntegerField()
+    won = IntegerField()
+    even = IntegerField()
+    lost = IntegerField()
+    scored = IntegerField()
+    taken = IntegerField()
+
+    @classmethod
+    def get_position(cls, team, year, matchday):
+        return (cls.select(cls.position)
+                .join(Championship)
+                .where((Championship.startyear == year) & (cls.team == team) & (cls.matchday == matchday))
+                .scalar())
+
+    def __str__(self):
+        return f"{self.position}. {self.team} {self.points} after the {self.matchday}th day of {self.championship}"
+
+
+def update_standings(championship, matchday=1):
+    '''
+    Recompute the standings of the championship from the matchday on, with the rules of its season.
+    It starts from the stored standings of the previous matchday, so appending a matchday only computes that matchday.
+    The head to head stats of the tiebreakers are accumulated from all the matches of the championship
+    '''
+    if not isinstance(championship, Championship):
+        championship = Championship.get_by_id(championship)
+    rules = championship.rules
+    with db.atomic():
+        previous = (Standing.select(fn.MAX(Standing.matchday))
+                    .where((Standing.championship == championship) & (Standing.matchday < matchday))
+                    .scalar())
+        # stats of each team and of each team against each opponent, with the keys of RESULTS_KEYS but the team
+        stats = {row.pop('team'): row for row in Standing.select(
+                     Standing.team, Standing.points, Standing.played, Standing.won, Standing.even,
+                     Standing.lost, Standing.scored, Standing.taken)
+                 .where((Standing.championship == championship) & (Standing.matchday == previous))
+                 .dicts()}
+        head_to_head = {}
+        matches = (Match.select(Match.number, Match.team1, Match.team2, Match.team1goals, Match.team2goals)
+                   .where(Match.championship == championship)
+                   .order_by(Match.number)
+                   .tuples())
+        rows = []
+        for number, day_matches in groupby(matches, key=lambda match: match[0]):
+            for _, team1, team2, goals1, goals2 in day_matches:
+                for team, opponent, scored, taken in ((team1, team2, goals1, goals2), (team2, team1, goals2, goals1)):
+                    won, even, lost = scored > taken, scored == taken, scored < taken
+                    # the stats of the matchdays before matchday are already in the stored standings
+                    keys = [(head_to_head, (team, opponent))] + ([(stats, team)] if number >= matchday else [])
+                    for table, key in keys:
+                        results = table.setdefault(key, dict.fromkeys(RESULTS_KEYS[1:], 0))
+                        results['points'] += rules.points(won, even, lost)
+                        results['played'] += 1
+                        results['won'] += won
+                        results['even'] += even
+                        results['lost'] += lost
+                        results['scored'] += scored
+                        results['taken'] += taken
+            if number < matchday:
+                continue
+            ranking = rules.order(sorted(stats), results_record(stats, head_to_head))
+            rows.extend((championship.id, team, number, position, *[stats[team][key] for key in RESULTS_KEYS[1:]])
+                        for position, team in enumerate(ranking, 1))
+        Standing.delete().where((Standing.championship == championship) &
+                                (Standing.matchday >= matchday)).execute()
+        insert_rows(Standing, [Standing.championship, Standing.team, Standing.matchday, Standing.position,
+                               Standing.points, Standing.played, Standing.won, Standing.even,
+                               Standing.lost, Standing.scored, Standing.taken], rows)
+    return len(rows)
+
+
+def insert_rows(model, fields, rows):
+    '''
+    insert the rows (tuples of plain values of the fields, ids for the foreign keys) in the table of model
+    with a single prepared statement. It skips the per-value query building of insert_many
+    '''
+    columns = ', '.join(f'"{field.column_name}"' for field in fields)
+    placeholders = ', '.join('?' * len(fields))
+    db.cursor().executemany(
+        f'INSERT INTO "{model._meta.table_name}" ({columns}) VALUES ({placeholders})', rows)
+
+
 if __name__ == '__main__':
     '''
     Create the tables in the database (does nothing if they exists)
     '''
     db.connect()
-    db.create_tables([Team, Championship, Match])
+    db.create_tables([Team, Championship, Match, Player, Goal, Matchday, DataVersion, Standing, Rating])
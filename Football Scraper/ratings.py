@@ -0,0 +1,175 @@
+'''
+Module that rates the teams with the Elo system over the whole history of the matches.
+The matches are read with a single query in date order and processed on plain lists, and the rating
+of each team before and after each match is stored in the Rating table. The update is incremental:
+it starts from the first date with matches that are not rated yet, e.g. the matchday just appended
+by jsontodb, from the ratings stored before that date. The rating of a team at a date is an indexed lookup
+    rating(team, date=None)
+    ratings(date=None)
+The usage is
+    python ratings.py [--date 2010-05-16] [--team Milan] [--rebuild]
+'''
+
+import argparse
+import datetime
+
+from peewee import JOIN, fn
+
+from models import Match, Rating, Team, db, insert_rows
+
+
+class Elo:
+    '''
+    Parameters of the Elo ratings.
+        k: points exchanged by a match between two teams with the same rating won by one goal
+        home: rating points added to the home team to compute the expected result
+        initial: rating of a team in its first match
+        margin: scale the points exchanged with the goal difference, as the World Football Elo Ratings
+
+        expected(rating1, rating2): expected result (1 win, 0.5 draw, 0 loss) of the home team
+        change(rating1, rating2, goals1, goals2): rating points gained by the home team, and lost by the guest
+    '''
+
+    def __init__(self, k=20, home=100, initial=1500, margin=True):
+        self.k = k
+        self.home = home
+        self.initial = initial
+        self.margin = margin
+
+    def expected(self, rating1, rating2):
+        return 1 / (1 + 10 ** ((rating2 - rating1 - self.home) / 400))
+
+    def change(self, rating1, rating2, goals1, goals2):
+        result = 1 if goals1 > goals2 else 0.5 if goals1 == goals2 else 0
+        difference = abs(goals1 - goals2)
+        factor = 1 if not self.margin or difference <= 1 else 1.5 if difference == 2 else (11 + difference) / 8
+        return self.k * factor * (result - self.expected(rating1, rating2))
+
+    def __repr__(self):
+        return f"Elo(k={self.k}, home={self.home}, initial={self.initial}, margin={self.margin})"
+
+
+# Parameters of the stored ratings. Changing them needs python ratings.py --rebuild
+ELO = Elo()
+
+
+def latest(date=None, before=False, teams=None):
+    '''
+        Map team id -> rating after the last match of the team on date, or before it with before
+        (the last match if date is None). A lookup on the index (team, date) for each team
+    '''
+    query = Rating.select(Rating.post).where(Rating.team == Team.id)
+    if date is not None:
+        query = query.where(Rating.date < date if before else Rating.date <= date)
+    query = query.order_by(Rating.date.desc(), Rating.match.desc()).limit(1)
+    teams_query = Team.select(Team.id, query.alias('rating'))
+    if teams is not None:
+        teams_query = teams_query.where(Team.id.in_(list(teams)))
+    return {team: value for team, value in teams_query.tuples() if value is not None}
+
+
+def rating(team, date=None, elo=ELO):
+    '''
+        Rating of the team after its last match on date (today if None), the initial rating if it did not play
+    '''
+    query = Rating.select(Rating.post).where(Rating.team == team)
+    if date is not None:
+        query = query.where(Rating.date <= date)
+    value = query.order_by(Rating.date.desc(), Rating.match.desc()).limit(1).scalar()
+    return elo.initial if value is None else value
+
+
+def ratings(date=None):
+    '''
+        List of the teams that played by date (today if None) with their rating, from the highest
+    '''
+    names = dict(Team.select(Team.id, Team.name).tuples())
+    rows = [{'team': names[team], 'rating': value} for team, value in latest(date).items()]
+    return sorted(rows, key=lambda row: -row['rating'])
+
+
+def update_ratings(championship=None, elo=ELO):
+    '''
+        Rate the matches that are not rated yet, of the championship or of any championship if None.
+        The rated matches are always the first ones in date order: the ratings from the date of the first
+        unrated match on are replaced, starting from the ratings stored before it, so appending a matchday
+        only rates that matchday. With a championship, only its matches and the ones from the date
+        of the last rating on are checked. Returns the number of rated matches
+    '''
+    with db.atomic():
+        unrated = (Match.select(fn.MIN(Match.date))
+                   .join(Rating, JOIN.LEFT_OUTER, on=(Rating.match == Match.id))
+                   .where(Rating.id.is_null()))
+        last = Rating.select(fn.MAX(Rating.date)).scalar()
+        if championship is None or last is None:
+            starts = [unrated.scalar()]
+        else:
+            starts = [unrated.where(Match.championship == championship).scalar(),
+                      unrated.where(Match.date >= last).scalar()]
+        starts = [Match.date.python_value(start) for start in starts if start is not None]
+        if not starts:
+            return 0
+        start = min(starts)
+        Rating.delete().where(Rating.date >= start).execute()
+        current = latest(start, before=True)
+        matches = (Match.select(Match.id, Match.date, Match.team1, Match.team2, Match.team1goals, Match.team2goals)
+                   .where(Match.date >= start)
+                   .order_by(Match.date, Match.id)
+                   .tuples())
+        rows = []
+        for match, date, team1, team2, goals1, goals2 in matches:
+            rating1, rating2 = current.get(team1, elo.initial), current.get(team2, elo.initial)
+            change = elo.change(rating1, rating2, goals1, goals2)
+            current[team1], current[team2] = rating1 + change, rating2 - change
+            rows.append((match, team1, date.isoformat(), rating1, rating1 + change))
+            rows.append((match, team2, date.isoformat(), rating2, rating2 - change))
+        insert_rows(Rating, [Rating.match, Rating.team, Rating.date, Rating.pre, Rating.post], rows)
+    return len(rows) // 2
+
+
+def forget_ratings(matches):
+    '''
+        Delete the ratings from the date of the first of the matches (a query of Match.id) on,
+        before the matches are deleted or changed. update_ratings rates them again
+    '''
+    start = Match.select(fn.MIN(Match.date)).where(Match.id.in_(matches)).scalar()
+    if start is not None:
+        Rating.delete().where(Rating.date >= Match.date.python_value(start)).execute()
+
+
+def rebuild_ratings(elo=ELO):
+    '''
+        Rate again every match, e.g. after changing the parameters of ELO
+    '''
+    with db.atomic():
+        Rating.delete().execute()
+        return update_ratings(elo=elo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                        help='print the ratings at this date (default: today)')
+    parser.add_argument('--team', default=None,
+                        help='print the ratings of this team in every match')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='rate again every match')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='number of teams printed')
+    args = parser.parse_args()
+
+    db.create_tables([Rating])
+    count = rebuild_ratings() if args.rebuild else update_ratings()
+    if count:
+        print(f"{count} matches rated.")
+    if args.team is not None:
+        team = Team.get(Team.name == args.team)
+        history = (Rating.select(Rating.date, Rating.pre, Rating.post).where(Rating.team == team)
+                   .order_by(Rating.date, Rating.match))
+        if args.date is not None:
+            history = history.where(Rating.date <= args.date)
+        for row in history:
+            print(f"{row.date} {row.pre:7.1f} -> {row.post:7.1f}")
+    else:
+        for position, row in enumerate(ratings(args.date)[:args.limit], 1):
+            print(f"{position:3d}. {row['team']:<24} {row['rating']:7.1f}")
@@ -0,0 +1,175 @@
+'''
+Module that replays the championships matchday by matchday: the matches of a season are loaded
+in NumPy arrays ordered by Match.number and the stats of every team after every matchday
+are computed with a single cumulative sum, then sorted with the rules of the season. It answers "what did the table look like after matchday N"
+and "when was the title decided" without querying the database again.
+The usage is
+    python replay.py [--first 1986] [--last 2020] [--year 2010 --matchday 19]
+'''
+
+import argparse
+
+import numpy as np
+
+from models import Championship, Match, Team, RESULTS_KEYS, db
+from rules import Rules, season_rules
+
+# Order of the stats in the first axis of Replay.stats
+STATS = RESULTS_KEYS[1:]
+
+
+class Replay:
+    '''
+    Standings of a championship after every matchday.
+        teams: names of the teams, ordered by id as the ties of the standings
+        rules: scoring rules and tiebreakers of the championship
+        matchdays: numbers of the matchdays
+        stats: array (stat, team, matchday) of the cumulative stats, in the order of STATS
+        head_to_head: array (points/scored/taken, team, opponent, matchday) of the cumulative stats
+            of each team against each opponent
+        positions: array (team, matchday) of the position of each team after each matchday
+        remaining: array (team, matchday) of the matches each team still has to play after each matchday
+
+        table(matchday=None): standings after the matchday (the last one if None), sorted by position
+        trajectory(team): positions of the team after every matchday
+        clinched(places=1): matchday after which each team was sure to finish in the first places
+        eliminated(places=1): matchday after which each team could no longer finish in the first places
+    '''
+
+    def __init__(self, teams, number, team1, team2, goals1, goals2, rules=None):
+        '''
+            teams: names of the teams, indexed by the codes in team1 and team2.
+            number, team1, team2, goals1, goals2: arrays with one element per match.
+            rules: Rules of the championship, 3 points for a win and 1 for a draw if None
+        '''
+        self.teams = list(teams)
+        self.rules = rules if rules is not None else Rules()
+        self.matchdays, day = np.unique(number, return_inverse=True)
+        count, days = len(self.teams), len(self.matchdays)
+        team, opponent = np.concatenate([team1, team2]), np.concatenate([team2, team1])
+        scored = np.concatenate([goals1, goals2]).astype(np.int32)
+        taken = np.concatenate([goals2, goals1]).astype(np.int32)
+        won, even, lost = scored > taken, scored == taken, scored < taken
+        points = self.rules.points(won.astype(np.int32), even, lost)
+        # each team row of a match adds to the cell (team, matchday): a bincount per stat, then a cumsum
+        cell = team * days + np.concatenate([day, day])
+        increments = np.stack([points, np.ones_like(scored), won, even, lost, scored, taken])
+        self.stats = np.stack([np.bincount(cell, weights=values, minlength=count * days)
+                               for values in increments]).reshape(len(STATS), count, days).cumsum(axis=2)
+        self.stats = self.stats.astype(np.int32)
+        # the same for the cells (team, opponent, matchday) of the head to head tiebreakers
+        cell = (team * count + opponent) * days + np.concatenate([day, day])
+        self.head_to_head = np.stack([np.bincount(cell, weights=values, minlength=count * count * days)
+                                      for values in (points, scored, taken)])
+        self.head_to_head = self.head_to_head.reshape(3, count, count, days).cumsum(axis=3).astype(np.int32)
+        # sort the teams after every matchday with the rules: a Python sort of count teams per matchday,
+        # on plain lists, as the tiebreakers are arbitrary functions
+        totals = self.stats[[STATS.index('points'), STATS.index('scored'), STATS.index('taken')]]
+        totals = totals.transpose(2, 1, 0).tolist()
+        self.positions = np.empty((count, days), dtype=np.int32)
+        for column in range(days):
+            versus = self.head_to_head[:, :, :, column]
+
+            def record(team, opponent=None, column=column, versus=versus):
+                return totals[column][team] if opponent is None else versus[:, team, opponent].tolist()
+            for position, team in enumerate(self.rules.order(range(count), record), 1):
+                self.positions[team, column] = position
+        played = self.stats[STATS.index('played')]
+        # a double round robin, unless more matches were loaded
+        games = np.maximum(played[:, -1], 2 * (count - 1)) if days else np.zeros(count, dtype=np.int32)
+        self.remaining = games[:, None] - played
+
+    def table(self, matchday=None):
+        if matchday is None:
+            matchday = self.matchdays[-1] if len(self.matchdays) else 0
+        column = int(np.searchsorted(self.matchdays, matchday, side='right')) - 1
+        if column < 0:
+            return []
+        rows = sorted(range(len(self.teams)), key=lambda team: self.positions[team, column])
+        return [dict(zip(('team',) + STATS + ('position',),
+                         (self.teams[team], *self.stats[:, team, column].tolist(),
+                          int(self.positions[team, column]))))
+                for team in rows]
+
+    def trajectory(self, team):
+        return self.positions[self.teams.index(team)].tolist()
+
+    def _maximum(self):
+        return self.stats[STATS.index('points')] + self.rules.win * self.remaining
+
+    def clinched(self, places=1):
+        points = self.stats[STATS.index('points')]
+        # teams other than i that can still reach the points of i, for each (i, matchday)
+        reach = (self._maximum()[None, :, :] >= points[:, None, :]).sum(axis=1) - 1
+        return self._first(reach < places)
+
+    def eliminated(self, places=1):
+        points = self.stats[STATS.index('points')]
+        # teams that already have more points than i can reach, for each (i, matchday)
+        ahead = (points[None, :, :] > self._maximum()[:, None, :]).sum(axis=1)
+        return self._first(ahead >= places)
+
+    def _first(self, decided):
+        '''
+            map team -> first matchday in which decided (team, matchday) is True
+        '''
+        first = decided.argmax(axis=1)
+        return {self.teams[team]: int(self.matchdays[first[team]])
+                for team in np.flatnonzero(decided.any(axis=1))}
+
+
+def load_replays(seasons=None):
+    '''
+        Map startyear -> Replay of the championships starting in the years seasons (all if None),
+        loaded with a single query
+    '''
+    query = (Match.select(Championship.startyear, Match.number, Match.team1, Match.team2,
+                          Match.team1goals, Match.team2goals)
+             .join(Championship)
+             .order_by(Championship.startyear, Match.number, Match.id))
+    if seasons is not None:
+        query = query.where(Championship.startyear.in_(list(seasons)))
+    rows = db.execute(query).fetchall()
+    if not rows:
+        return {}
+    year, number, team1, team2, goals1, goals2 = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    names = dict(Team.select(Team.id, Team.name).tuples())
+    replays = {}
+    starts = np.flatnonzero(np.diff(year, prepend=year[0] - 1))
+    for start, end in zip(starts, np.append(starts[1:], len(year))):
+        ids, codes = np.unique(np.concatenate([team1[start:end], team2[start:end]]), return_inverse=True)
+        replays[int(year[start])] = Replay([names[id] for id in ids.tolist()], number[start:end],
+                                           codes[:end - start], codes[end - start:],
+                                           goals1[start:end], goals2[start:end], season_rules(int(year[start])))
+    return replays
+
+
+def load_replay(year):
+    '''
+        Replay of the championship year/year+1
+    '''
+    return load_replays([year]).get(year)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first', type=int, default=1986,
+                        help='first season to replay')
+    parser.add_argument('--last', type=int, default=2020,
+                        help='last season to replay')
+    parser.add_argument('--year', type=int, default=None,
+                        help='print the table of this season after --matchday')
+    parser.add_argument('--matchday', type=int, default=None,
+                        help='matchday of the table printed with --year (default: the last one)')
+    args = parser.parse_args()
+
+    if args.year is not None:
+        for row in load_replay(args.year).table(args.matchday):
+            print(f"{row['position']:3d}. {row['team']:<20} {row['points']:3d} {row['played']:3d}"
+                  f" {row['scored']:3d}-{row['taken']:<3d}")
+        raise SystemExit
+    for year, replay in load_replays(range(args.first, args.last + 1)).items():
+        champion = replay.table()[0]['team']
+        decided = replay.clinched().get(champion)
+        print(f"{year}-{(year + 1) % 100}: {champion}, title decided after the matchday {decided}"
+              f" of {int(replay.matchdays[-1])}")
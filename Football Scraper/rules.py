@@ -0,0 +1,119 @@
+'''
+Module with the scoring rules of the championships: the points of a win, a draw and a loss
+and the chain of tiebreakers between the teams with the same points.
+Serie A gave 2 points for a win up to the championship 1993-94 and 3 points from 1994-95
+'''
+
+from itertools import groupby
+
+from peewee import Case
+
+
+def head_to_head_points(team, tied, record):
+    '''
+    points of the team in the matches against the other tied teams
+    '''
+    return sum(record(team, opponent)[0] for opponent in tied if opponent != team)
+
+
+def head_to_head_difference(team, tied, record):
+    '''
+    goal difference of the team in the matches against the other tied teams
+    '''
+    return sum(record(team, opponent)[1] - record(team, opponent)[2] for opponent in tied if opponent != team)
+
+
+def goal_difference(team, tied, record):
+    points, scored, taken = record(team)
+    return scored - taken
+
+
+def goals_scored(team, tied, record):
+    return record(team)[1]
+
+
+# Tiebreakers of Serie A, applied in order
+TIEBREAKERS = (head_to_head_points, head_to_head_difference, goal_difference, goals_scored)
+
+
+class Rules:
+    '''
+    Scoring rules of a championship.
+        win/even/loss: points of a won, drawn and lost match
+        tiebreakers: functions tiebreaker(team, tied, record) applied in order to the teams with the same points:
+            the team with the higher value is ranked first. tied are the teams with the same points and
+            record(team, opponent=None) is the tuple (points, scored, taken) of the team in all its matches,
+            or in the matches against opponent ((0, 0, 0) if they did not play)
+
+        points(won, even, lost=0): points of the results
+        order(teams, record): the teams sorted from the first to the last. The teams still tied after
+            all the tiebreakers keep the order of teams
+    '''
+
+    def __init__(self, win=3, even=1, loss=0, tiebreakers=TIEBREAKERS):
+        self.win = win
+        self.even = even
+        self.loss = loss
+        self.tiebreakers = tuple(tiebreakers)
+
+    def points(self, won, even, lost=0):
+        return self.win * won + self.even * even + self.loss * lost
+
+    def order(self, teams, record):
+        points = {team: record(team)[0] for team in teams}
+        ranking = []
+        for _, tied in groupby(sorted(points, key=lambda team: -points[team]), key=points.get):
+            tied = list(tied)
+            ranking.extend(self._break(tied, tied, record, self.tiebreakers))
+        return ranking
+
+    def _break(self, teams, tied, record, tiebreakers):
+        '''
+            teams, among the tied ones, sorted by the first of tiebreakers. The next one is computed
+            only for the teams that are still level, but always among all the tied teams
+        '''
+        if len(teams) < 2 or not tiebreakers:
+            return teams
+        values = {team: tiebreakers[0](team, tied, record) for team in teams}
+        ranking = []
+        for _, level in groupby(sorted(teams, key=lambda team: -values[team]), key=values.get):
+            ranking.extend(self._break(list(level), tied, record, tiebreakers[1:]))
+        return ranking
+
+    def __repr__(self):
+        tiebreakers = ', '.join(tiebreaker.__name__ for tiebreaker in self.tiebreakers)
+        return f"Rules(win={self.win}, even={self.even}, loss={self.loss}, tiebreakers=({tiebreakers}))"
+
+
+# Rules of the championships starting from each year, up to the next one
+SEASONS = {0: Rules(win=2), 1994: Rules(win=3)}
+
+
+def season_rules(year):
+    '''
+    rules of the championship starting in the year
+    '''
+    return SEASONS[max(start for start in SEASONS if start <= year)]
+
+
+def season_points(startyear, result):
+    '''
+    SQL expression of the points of a result ('win', 'even' or 'loss')
+    in the championship starting in the year of the column startyear
+    '''
+    starts = sorted(SEASONS)
+    return Case(None, [(startyear < later, getattr(SEASONS[start], result)) for start, later in zip(starts, starts[1:])],
+                getattr(SEASONS[starts[-1]], result))
+
+
+def results_record(stats, head_to_head):
+    '''
+    function record(team, opponent=None) of Rules.order from the stats of the teams (team -> results)
+    and the head to head matrix ((team, opponent) -> results), with the keys of models.RESULTS_KEYS
+    '''
+    def record(team, opponent=None):
+        results = stats[team] if opponent is None else head_to_head.get((team, opponent))
+        if results is None:
+            return 0, 0, 0
+        return results['points'], results['scored'], results['taken']
+    return record
@@ -0,0 +1,60 @@
+# HTTP cache policy of the archive
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+
+import re
+from datetime import date
+
+from scrapy.extensions.httpcache import RFC2616Policy
+
+# Season in the url of a matchday, e.g. .../archivio/1986-87/UNICO/UNI/1
+SEASON = re.compile(r'/(\d{4})-\d{2}/')
+
+
+class SeasonPolicy(RFC2616Policy):
+    '''
+        HTTP cache policy of the archive of the championships.
+        The pages of the seasons before the current one never change: they are served from the cache without
+        any request. The pages of the current season can still change, with postponed matches (recuperi) and
+        corrected results: they are always revalidated with conditional requests (ETag/Last-Modified) when the
+        website sends the validators, and downloaded again otherwise.
+        The current season starts in the month SERIEA_SEASON_START_MONTH (default 9, September)
+    '''
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.start_month = settings.getint('SERIEA_SEASON_START_MONTH', 9)
+
+    def should_cache_response(self, response, request):
+        # The pages are stored even without expiration or validators: is_cached_response_fresh decides
+        return response.status == 200 or super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if self.is_final(request):
+            return True
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+    def is_final(self, request):
+        '''
+            True if the request is the page of a matchday of a season before the current one
+        '''
+        year = season_year(request.url)
+        return year is not None and year < current_season(self.start_month)
+
+
+def season_year(url):
+    '''
+        Year when the season in the url of a matchday started, None if the url is not a matchday
+    '''
+    match = SEASON.search(url)
+    return int(match.group(1)) if match else None
+
+
+def current_season(start_month, today=None):
+    '''
+        Year when the current season started, the seasons start in start_month
+    '''
+    today = today or date.today()
+    return today.year if today.month >= start_month else today.year - 1
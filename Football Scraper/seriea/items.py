@@ -6,7 +6,16 @@
 import scrapy
 
 
-class SerieaItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+class MatchItem(scrapy.Item):
+    # team1 is the home team, team2 the guest team: dictionaries with name, goals and scorers
+    team1 = scrapy.Field()
+    team2 = scrapy.Field()
+
+
+class MatchdayItem(scrapy.Item):
+    # number of the game of the championship, date as a dictionary with day, month and year,
+    # start year of the championship and list of MatchItem
+    number = scrapy.Field()
+    date = scrapy.Field()
+    refyear = scrapy.Field()
+    matches = scrapy.Field()
@@ -6,8 +6,167 @@
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+import json
+import os
 
 
 class SerieaPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class SeasonFilesPipeline:
+    '''
+        Pipeline that writes every matchday in the json lines file of its season,
+        SEASON_FILES_DIR/championshipYEAR.jsonl, so a single crawl of many seasons
+        produces the same files of one crawl per season.
+        It is enabled by the setting SEASON_FILES_DIR
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get('SEASON_FILES_DIR')
+        if not directory:
+            raise NotConfigured
+        return cls(directory)
+
+    def open_spider(self, spider):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def process_item(self, item, spider):
+        day = ItemAdapter(item).asdict()
+        year = day['refyear']
+        if year not in self.files:
+            self.files[year] = open(os.path.join(self.directory, f'championship{year}.jsonl'), 'w')
+        self.files[year].write(json.dumps(day) + '\n')
+        return item
+
+    def close_spider(self, spider):
+        for season_file in self.files.values():
+            season_file.close()
+
+
+class DatabasePipeline:
+    '''
+        Pipeline that writes the matchdays in the sqlite database SERIEA_DATABASE (e.g. data/serieA.db),
+        without going through the json files. It is enabled by the setting SERIEA_DATABASE.
+        The items are buffered and written every SERIEA_DATABASE_BATCH_DAYS matchdays (default 10)
+        in a transaction run by a dedicated thread, so the crawl never waits for sqlite.
+        The thread keeps the same connection and maps of the team and player ids for the whole crawl,
+        updated only by the batches that commit, and, as jsontodb.py, skips the matchdays already
+        in the database unchanged. A batch that fails is rolled back and logged, and the crawl goes on
+    '''
+
+    def __init__(self, path, batch_days):
+        self.path = path
+        self.batch_days = batch_days
+        self.days = []
+        self.pending = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('SERIEA_DATABASE')
+        if not path:
+            raise NotConfigured
+        return cls(path, crawler.settings.getint('SERIEA_DATABASE_BATCH_DAYS', 10))
+
+    def open_spider(self, spider):
+        from twisted.python.threadpool import ThreadPool
+        self.pool = ThreadPool(minthreads=1, maxthreads=1, name='seriea-database')
+        self.pool.start()
+        self.run(self.connect)
+
+    def run(self, function, *args):
+        from twisted.internet import reactor, threads
+        deferred = threads.deferToThreadPool(reactor, self.pool, function, *args)
+        self.pending.append(deferred)
+        return deferred
+
+    def connect(self):
+        import jsontodb
+        from models import (Championship, DataVersion, Goal, Match, Matchday, Player, Rating, Standing, Team, db,
+                            init_database)
+        init_database(self.path)
+        db.connect(reuse_if_open=True)
+        db.create_tables([Team, Championship, Match, Player, Goal, Matchday, DataVersion, Standing, Rating])
+        self.teams, self.players = jsontodb.team_ids(), jsontodb.player_ids()
+
+    def write(self, days):
+        import jsontodb
+        from models import Championship, db
+        seasons = {}
+        for day in days:
+            seasons.setdefault(day['refyear'], []).append(day)
+        count = 0
+        for year, season_days in seasons.items():
+            # the new teams and players enter the maps only when their rows are committed:
+            # after a rollback sqlite gives their ids to the next rows inserted
+            teams, players = dict(self.teams), dict(self.players)
+            with db.atomic():
+                dbchampionship, created = Championship.get_or_create(startyear=year)
+                count += jsontodb.write_days(dbchampionship, list(jsontodb.changed_days(dbchampionship, season_days)),
+                                             teams, players=players)
+            self.teams, self.players = teams, players
+        return count
+
+    def flush(self, spider):
+        days, self.days = self.days, []
+        if days:
+            self.run(self.write, days).addCallbacks(
+                lambda count: spider.logger.info(f'{count} matches of {len(days)} matchdays written in {self.path}'),
+                lambda failure: spider.logger.error(f'Error writing {len(days)} matchdays in {self.path}, '
+                                                    f'rolled back: {failure.getErrorMessage()}'))
+
+    def process_item(self, item, spider):
+        self.days.append(ItemAdapter(item).asdict())
+        if len(self.days) >= self.batch_days:
+            self.flush(spider)
+        return item
+
+    def close_spider(self, spider):
+        from twisted.internet.defer import DeferredList
+        from models import db
+        self.flush(spider)
+        self.run(db.close)
+
+        def stop(results):
+            self.pool.stop()
+            for success, failure in results:
+                if not success:
+                    spider.logger.error(f'Error writing in {self.path}: {failure.getErrorMessage()}')
+        return DeferredList(self.pending, consumeErrors=True).addCallback(stop)
+
+
+class ParquetPipeline:
+    '''
+        Pipeline that collects the matchdays of every season and writes them
+        in the Parquet dataset (see storage.py) when the spider closes.
+        The directory of the dataset is the setting PARQUET_ROOT (default data/parquet).
+        storage, and so pyarrow, is imported only when the pipeline is enabled
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self.seasons = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        import storage
+        return cls(crawler.settings.get('PARQUET_ROOT', storage.ROOT))
+
+    def process_item(self, item, spider):
+        day = ItemAdapter(item).asdict()
+        self.seasons.setdefault(day['refyear'], []).append(day)
+        return item
+
+    def close_spider(self, spider):
+        import storage
+        for year, days in self.seasons.items():
+            storage.write_season(year, days, self.root)
+            spider.logger.info(f'Championship {year} written in {self.root}')
@@ -21,6 +21,9 @@ ROBOTSTXT_OBEY = True
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 #CONCURRENT_REQUESTS = 32
+# All the seasons are crawled in one process: the load on the website is bounded
+# by the requests per domain and by AutoThrottle instead of sleeping between seasons
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -65,24 +68,46 @@ ROBOTSTXT_OBEY = True
 #ITEM_PIPELINES = {
 #    'seriea.pipelines.SerieaPipeline': 300,
 #}
+# Write every matchday in the json lines file of its season when SEASON_FILES_DIR is set
+# and in the sqlite database when SERIEA_DATABASE is set
+ITEM_PIPELINES = {
+    'seriea.pipelines.SeasonFilesPipeline': 300,
+    'seriea.pipelines.DatabasePipeline': 350,
+}
+#SEASON_FILES_DIR = 'data'
+#SERIEA_DATABASE = 'data/serieA.db'
+#SERIEA_DATABASE_BATCH_DAYS = 10
+# Write the matchdays in the Parquet dataset too (see storage.py)
+#ITEM_PIPELINES = {
+#    'seriea.pipelines.SeasonFilesPipeline': 300,
+#    'seriea.pipelines.ParquetPipeline': 400,
+#}
+#PARQUET_ROOT = 'data/parquet'
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = True
 # The initial download delay
-#AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_START_DELAY = 1
 # The maximum download delay to be set in case of high latencies
-#AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_MAX_DELAY = 60
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = 'httpcache'
+# The pages of the past seasons never change: seriea.httpcache.SeasonPolicy serves them from the cache
+# and revalidates only the pages of the current season, so crawling again is incremental.
+# Set HTTPCACHE_STORAGE to 'scrapy.extensions.httpcache.DbmCacheStorage' to keep the cache in a DBM file
+HTTPCACHE_ENABLED = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = 'httpcache'
 #HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_GZIP = True
+HTTPCACHE_POLICY = 'seriea.httpcache.SeasonPolicy'
+# Month when a season starts: the seasons started before the current one are final
+SERIEA_SEASON_START_MONTH = 9
@@ -1,18 +1,60 @@
 import scrapy
+from cssselect import HTMLTranslator
 from datetime import datetime
+from lxml import etree
 import re
 
+from seriea.items import MatchdayItem, MatchItem
+
+
+def compile_css(css):
+    '''
+    Compile once the XPath of a css selector, with the same translation used by response.css
+    '''
+    query = css.replace('::text', '')
+    xpath = HTMLTranslator().css_to_xpath(query)
+    if css.endswith('::text'):
+        xpath += '/text()'
+    return etree.XPath(xpath, smart_strings=False)
+
+
+# Selectors of the page of a matchday
+TITLE = compile_css('section.risultati h3::text')
+GAMES = compile_css('section.risultati div.box-partita')
+TEAM1 = compile_css('div.risultatosx')
+TEAM2 = compile_css('div.risultatodx')
+# Selectors of the box of a team in a game
+NAME = compile_css('h4.nomesquadra::text')
+GOALS = compile_css('span::text')
+SCORERS = compile_css('p.marcatori-partita::text')
+
+
+def first_text(elements, xpath):
+    '''
+    First result of xpath over all the elements, like SelectorList.css(...).get()
+    '''
+    for element in elements:
+        result = xpath(element)
+        if result:
+            return result[0]
+    return None
+
 
 class ChampionshipSpider(scrapy.Spider):
     '''
         Scrapy Spider that scraps the results of the SerieA (italian premier league) from the archive of the official website
             match is the name of the spider
             y is the year we want to scrape passed as an argument
+            years are the years we want to scrape, passed as an argument as a range (1986-2020) or a list (1986,1990)
+            base_url is the url of the archive, passed as an argument to crawl a mirror
         The usage is
-            scrapy crawl match -a year=1996 -O data/championship1996.json
+            scrapy crawl match -a year=1996 -O data/championship1996.jsonl
+        or, to crawl all the seasons in the same process writing a file for each season,
+            scrapy crawl match -a years=1986-2020 -s SEASON_FILES_DIR=data
     '''
     name = "match"
     y = None
+    base_url = "https://www.legaseriea.it/it/serie-a/archivio"
 
     def find_max_days(self, year):
         '''
@@ -26,19 +68,32 @@ class ChampionshipSpider(scrapy.Spider):
             return 34
         return 38
 
-    def __init__(self, year=1986, *args, **kwargs):
+    def __init__(self, year=1986, years=None, base_url=None, *args, **kwargs):
         '''
-        Initialization of the spider and the year
+        Initialization of the spider, the years and the url of the archive
         '''
         super(ChampionshipSpider, self).__init__(*args, **kwargs)
         self.y = int(year)
+        self.years = self.parse_years(years) if years else [self.y]
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+
+    def parse_years(self, years):
+        '''
+        List of years from a range (1986-2020) or a comma separated list (1986,1990)
+        '''
+        if "-" in years:
+            first, last = years.split("-")
+            return list(range(int(first), int(last) + 1))
+        return [int(year) for year in years.split(",")]
 
     def start_requests(self):
         '''
-            Definition of the scrape urls and request parsing
+            Definition of the scrape urls of all the years and request parsing.
+            All the requests are scheduled at once: the concurrency is set by the settings
         '''
         urls = [
-            f"https://www.legaseriea.it/it/serie-a/archivio/{self.y:02d}-{(self.y+1)%100:02d}/UNICO/UNI/{i}" for i in range(1, self.find_max_days(self.y)+1)]
+            f"{self.base_url}/{y:02d}-{(y+1)%100:02d}/UNICO/UNI/{i}" for y in self.years for i in range(1, self.find_max_days(y)+1)]
 
         for url in urls:
             yield scrapy.Request(url=url, callback=self.parse)
@@ -47,42 +102,32 @@ class ChampionshipSpider(scrapy.Spider):
         '''
             Parsing function that retrive the match number, date, a list of matches with scores and scorers
         '''
-        title = response.css('section.risultati h3::text').get().strip()
+        root = response.selector.root
+        title = first_text([root], TITLE).strip()
         number, date = title.split("-")
         refyear = response.request.url.split("/")[-4]
         date = datetime.strptime(date.strip(), '%d/%m/%Y')
         number = int(re.findall(r'\d+', number)[0])
 
-        matches = [self.parse_game(game) for game in response.css(
-            'section.risultati div.box-partita')]
+        matches = [self.parse_game(game) for game in GAMES(root)]
 
-        yield {'number': number,
-               'date': {'day': date.day,
-                        'month': date.month,
-                        'year': date.year},
-               'refyear': int(refyear.split("-")[0]),
-               'matches': matches,
-               }
+        yield MatchdayItem(number=number,
+                           date={'day': date.day,
+                                 'month': date.month,
+                                 'year': date.year},
+                           refyear=int(refyear.split("-")[0]),
+                           matches=matches)
 
     def parse_game(self, game):
         '''
-            Extract the match infos from the game box (div)
+            Extract the match infos from the game box (div element).
+            The selectors are compiled once at module level and run on the lxml elements
         '''
-        sx = game.css('div.risultatosx')
-        teamsx = sx.css('h4.nomesquadra::text').get().strip()
-        goalssx = int(sx.css('span::text').get().strip())
-        scorerssx = [player.strip() for player in sx.css(
-            'p.marcatori-partita::text').getall() if player.strip() != '']
-
-        dx = game.css('div.risultatodx')
-        teamdx = dx.css('h4.nomesquadra::text').get().strip()
-        goalsdx = int(dx.css('span::text').get().strip())
-        scorersdx = [player.strip() for player in dx.css(
-            'p.marcatori-partita::text').getall() if player.strip() != '']
-
-        return {'team1': {'name': teamsx,
-                          'goals': goalssx,
-                          'scorers': scorerssx},
-                'team2': {'name': teamdx,
-                          'goals': goalsdx,
-                          'scorers': scorersdx}}
+        teams = MatchItem()
+        for key, side in (('team1', TEAM1), ('team2', TEAM2)):
+            boxes = side(game)
+            teams[key] = {'name': first_text(boxes, NAME).strip(),
+                          'goals': int(first_text(boxes, GOALS).strip()),
+                          'scorers': [player.strip() for box in boxes for player in SCORERS(box)
+                                      if player.strip() != '']}
+        return teams
@@ -0,0 +1,345 @@
+'''
+Module that forecasts a championship with a Monte Carlo simulation of its remaining matches.
+The attack and defence strengths of the teams are fitted on the goals of the matches of the season and of the
+previous ones, weighted by their age, with a Poisson model with home advantage and the Dixon-Coles correction
+of the low scores. The remaining matches of many seasons are drawn at once with NumPy, in batches spread
+over a pool of processes, and every simulated season is ranked with the rules of the championship.
+The result is the probability of each team to finish in each position.
+The usage is
+    python simulate.py [--year 2020] [--matchday 19] [--seasons 100000] [--workers 4] [--europe 6] [--relegation 3]
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import time
+
+import numpy as np
+
+from models import Championship, Match, Team
+from rules import goal_difference, goals_scored, head_to_head_difference, head_to_head_points
+
+# Goals of a team in a match above which the probability is ignored
+MAX_GOALS = 10
+# Values of the Dixon-Coles parameter rho tried by the fit
+RHO_GRID = np.linspace(-0.2, 0.2, 81)
+# Simulated seasons drawn at once by a worker
+BATCH = 5000
+
+
+def fit_strengths(count, team1, team2, goals1, goals2, weights=None, prior=2.0, iterations=200, tolerance=1e-8):
+    '''
+        Attack and defence strengths of count teams from the matches (arrays of team codes and goals),
+        weighted by weights. The goals of the home team are Poisson with mean home * attack[team1] * defence[team2],
+        the goals of the guest with mean attack[team2] * defence[team1].
+        prior is the weight, in matches, of an average team added to every team, so a team with few matches
+        is close to the average. Returns (attack, defence, home, rho), with rho the Dixon-Coles parameter
+    '''
+    weights = np.ones(len(team1)) if weights is None else np.asarray(weights, dtype=float)
+    goals1, goals2 = np.asarray(goals1, dtype=float), np.asarray(goals2, dtype=float)
+    scored = (np.bincount(team1, weights * goals1, count) + np.bincount(team2, weights * goals2, count))
+    taken = (np.bincount(team1, weights * goals2, count) + np.bincount(team2, weights * goals1, count))
+    mean = (weights * (goals1 + goals2)).sum() / max(2 * weights.sum(), 1e-12)
+    attack, defence, home = np.ones(count), np.full(count, max(mean, 1e-3)), 1.0
+    for _ in range(iterations):
+        # maximum likelihood of each parameter given the others, plus prior matches against average teams
+        exposure = (np.bincount(team1, weights * home * defence[team2], count) +
+                    np.bincount(team2, weights * defence[team1], count))
+        level = defence.mean()
+        new_attack = (scored + prior * mean) / (exposure + prior * level)
+        exposure = (np.bincount(team2, weights * home * new_attack[team1], count) +
+                    np.bincount(team1, weights * new_attack[team2], count))
+        new_defence = (taken + prior * mean) / (exposure + prior * mean / level)
+        expected = (weights * new_attack[team1] * new_defence[team2]).sum()
+        new_home = (weights * goals1).sum() / expected if expected > 0 else 1.0
+        # the product attack * defence is the same with attack / c and defence * c: keep the mean attack at 1
+        scale = new_attack.mean()
+        new_attack, new_defence = new_attack / scale, new_defence * scale
+        change = max(np.abs(new_attack - attack).max(), np.abs(new_defence - defence).max(), abs(new_home - home))
+        attack, defence, home = new_attack, new_defence, new_home
+        if change < tolerance:
+            break
+    rho = fit_rho(home * attack[team1] * defence[team2], attack[team2] * defence[team1],
+                  goals1, goals2, weights)
+    return attack, defence, home, rho
+
+
+def dixon_coles(mean1, mean2, goals1, goals2, rho):
+    '''
+        Dixon-Coles factor of the probability of the scores goals1-goals2 with Poisson means mean1 and mean2
+    '''
+    factor = np.ones(np.broadcast(mean1, mean2, goals1, goals2).shape)
+    factor = np.where((goals1 == 0) & (goals2 == 0), 1 - mean1 * mean2 * rho, factor)
+    factor = np.where((goals1 == 0) & (goals2 == 1), 1 + mean1 * rho, factor)
+    factor = np.where((goals1 == 1) & (goals2 == 0), 1 + mean2 * rho, factor)
+    return np.where((goals1 == 1) & (goals2 == 1), 1 - rho, factor)
+
+
+def fit_rho(mean1, mean2, goals1, goals2, weights):
+    '''
+        rho of RHO_GRID with the highest weighted likelihood of the scores, the Poisson means being fixed
+    '''
+    low = (goals1 <= 1) & (goals2 <= 1)
+    if not low.any():
+        return 0.0
+    factors = dixon_coles(mean1[low][:, None], mean2[low][:, None],
+                          goals1[low][:, None], goals2[low][:, None], RHO_GRID[None, :])
+    valid = (factors > 0).all(axis=0)
+    likelihood = np.where(valid, (weights[low][:, None] * np.log(np.where(factors > 0, factors, 1))).sum(axis=0),
+                          -np.inf)
+    return round(float(RHO_GRID[likelihood.argmax()]), 6)
+
+
+def score_distribution(mean1, mean2, rho):
+    '''
+        Array (match, goals1 * (MAX_GOALS + 1) + goals2) of the probabilities of the scores of the matches
+        with Poisson means mean1 and mean2, corrected by Dixon-Coles
+    '''
+    goals = np.arange(MAX_GOALS + 1)
+    factorial = np.cumprod(np.concatenate([[1.0], goals[1:]]))
+    poisson1 = np.exp(-mean1[:, None]) * mean1[:, None] ** goals / factorial
+    poisson2 = np.exp(-mean2[:, None]) * mean2[:, None] ** goals / factorial
+    probability = poisson1[:, :, None] * poisson2[:, None, :]
+    probability *= dixon_coles(mean1[:, None, None], mean2[:, None, None], goals[None, :, None], goals[None, None, :],
+                               rho)
+    probability = probability.reshape(len(mean1), (MAX_GOALS + 1) ** 2)
+    return probability / probability.sum(axis=1, keepdims=True)
+
+
+def draw_scores(rng, cumulative, seasons):
+    '''
+        Goals of the home and of the guest team of every match (arrays (season, match)) drawn from the
+        cumulative distributions of score_distribution, with a single searchsorted:
+        adding the index of the match to its distribution makes all of them one increasing array
+    '''
+    matches, outcomes = cumulative.shape
+    offsets = np.arange(matches)
+    flat = (cumulative + offsets[:, None]).ravel()
+    draws = np.searchsorted(flat, rng.random((seasons, matches)) + offsets, side='right')
+    scores = np.minimum(draws - offsets * outcomes, outcomes - 1)
+    return scores // (MAX_GOALS + 1), scores % (MAX_GOALS + 1)
+
+
+def tied_sum(values, points):
+    '''
+        Sum of values (season, team, opponent) over the opponents with the same points as the team
+    '''
+    return (values * (points[:, :, None] == points[:, None, :])).sum(axis=2)
+
+
+# Vectorized tiebreakers of rules.py: keys (season, team) from the simulated points, head to head and totals
+VECTORIZED = {head_to_head_points: lambda state: tied_sum(state['versus_points'], state['points']),
+              head_to_head_difference: lambda state: tied_sum(state['versus_scored'] - state['versus_taken'],
+                                                              state['points']),
+              goal_difference: lambda state: state['scored'] - state['taken'],
+              goals_scored: lambda state: state['scored']}
+
+
+class Forecast:
+    '''
+    Monte Carlo forecast of a championship from its played matches and its remaining ones.
+        teams: names of the teams, ordered by id as the ties of the rankings
+        rules: scoring rules and tiebreakers of the championship
+        points/scored/taken: arrays (team) of the stats of the played matches
+        versus: array (points/scored/taken, team, opponent) of the stats of the played matches of each team
+            against each opponent
+        home/away: arrays (match) of the codes of the teams of the remaining matches
+        distribution: array (match, score) of the probabilities of the scores of the remaining matches
+
+        simulate(seasons=100000, workers=None, seed=0): Simulation of seasons seasons
+    '''
+
+    def __init__(self, teams, rules, played, remaining, attack, defence, home_advantage, rho):
+        '''
+            played: arrays team1, team2, goals1, goals2 of the played matches, with the codes of teams.
+            remaining: arrays home, away of the matches still to play.
+            attack, defence, home_advantage, rho: strengths of fit_strengths, for the codes of teams
+        '''
+        self.teams = list(teams)
+        self.rules = rules
+        count = len(self.teams)
+        team1, team2, goals1, goals2 = (np.asarray(column, dtype=np.int64) for column in played)
+        team, opponent = np.concatenate([team1, team2]), np.concatenate([team2, team1])
+        scored, taken = np.concatenate([goals1, goals2]), np.concatenate([goals2, goals1])
+        points = self.rules.points((scored > taken).astype(np.int64), scored == taken, scored < taken)
+        self.points = np.bincount(team, points, count).astype(np.int64)
+        self.scored = np.bincount(team, scored, count).astype(np.int64)
+        self.taken = np.bincount(team, taken, count).astype(np.int64)
+        pair = team * count + opponent
+        self.versus = np.stack([np.bincount(pair, values, count * count) for values in (points, scored, taken)])
+        self.versus = self.versus.reshape(3, count, count).astype(np.int64)
+        self.home, self.away = (np.asarray(column, dtype=np.int64) for column in remaining)
+        self.distribution = score_distribution(home_advantage * attack[self.home] * defence[self.away],
+                                               attack[self.away] * defence[self.home], rho)
+
+    def simulate(self, seasons=100000, workers=None, seed=0):
+        '''
+            Simulation of seasons seasons, drawn in batches of BATCH seasons by a pool of workers processes
+            (os.cpu_count() if None, in this process if 1). The same seed gives the same result
+        '''
+        sizes = [BATCH] * (seasons // BATCH) + ([seasons % BATCH] if seasons % BATCH else [])
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        workers = min(workers or os.cpu_count() or 1, len(sizes))
+        start = time.perf_counter()
+        if workers <= 1:
+            counts = [self.positions(size, seed) for size, seed in zip(sizes, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                counts = list(pool.map(self.positions, sizes, seeds))
+        counts = np.sum(counts, axis=0) if counts else np.zeros((len(self.teams),) * 2, dtype=np.int64)
+        return Simulation(self.teams, counts, self.points, time.perf_counter() - start)
+
+    def positions(self, seasons, seed):
+        '''
+            Array (team, position) of the number of the seasons, simulated with the generator seed,
+            in which each team finishes in each position
+        '''
+        rng = np.random.default_rng(seed)
+        count = len(self.teams)
+        goals1, goals2 = draw_scores(rng, np.cumsum(self.distribution, axis=1), seasons)
+        won, even, lost = goals1 > goals2, goals1 == goals2, goals1 < goals2
+        points1 = self.rules.points(won.astype(np.int64), even, lost)
+        points2 = self.rules.points(lost.astype(np.int64), even, won)
+        # each pair of teams plays at most one remaining match at home of each of them, so the results
+        # are added to the cells (team, opponent) of the head to head with a fancy index.
+        # The totals of a team are the sums of its row
+        state = {}
+        for name, values1, values2 in (('points', points1, points2), ('scored', goals1, goals2),
+                                       ('taken', goals2, goals1)):
+            versus = np.empty((seasons, count, count), dtype=np.int32)
+            versus[:] = self.versus[('points', 'scored', 'taken').index(name)]
+            versus[:, self.home, self.away] += values1
+            versus[:, self.away, self.home] += values2
+            state['versus_' + name], state[name] = versus, versus.sum(axis=2)
+        order = self.order(state)
+        return np.bincount((order * count + np.arange(count)).ravel(), minlength=count * count).reshape(count, count)
+
+    def order(self, state):
+        '''
+            Array (season, position) of the teams ranked with the rules. The tiebreakers of rules.py are
+            sorted at once: each of them depends only on the group of teams with the same points,
+            so a lexicographic sort gives the ranking of Rules.order. Other tiebreakers are applied
+            with Rules.order, a season at a time
+        '''
+        seasons, count = state['points'].shape
+        if all(tiebreaker in VECTORIZED for tiebreaker in self.rules.tiebreakers):
+            keys = [np.broadcast_to(np.arange(count), (seasons, count))]
+            keys += [-VECTORIZED[tiebreaker](state) for tiebreaker in reversed(self.rules.tiebreakers)]
+            return np.lexsort(keys + [-state['points']], axis=-1)
+        order = np.empty((seasons, count), dtype=np.int64)
+        for season in range(seasons):
+            totals = np.stack([state['points'][season], state['scored'][season], state['taken'][season]], axis=1)
+            versus = np.stack([state['versus_points'][season], state['versus_scored'][season],
+                               state['versus_taken'][season]])
+
+            def record(team, opponent=None, totals=totals.tolist(), versus=versus):
+                return totals[team] if opponent is None else versus[:, team, opponent].tolist()
+            order[season] = self.rules.order(range(count), record)
+        return order
+
+
+class Simulation:
+    '''
+    Result of a Forecast.
+        teams: names of the teams
+        seasons: number of simulated seasons
+        counts: array (team, position) of the seasons in which each team finished in each position
+        probabilities: array (team, position) of the probabilities of each position
+        seconds: time of the simulation
+
+        probability(first, last=None): map team -> probability to finish between the positions first and last (1 based)
+        table(europe=6, relegation=3): teams sorted by expected position, with the probabilities of the title,
+            of the first europe places and of the last relegation places
+    '''
+
+    def __init__(self, teams, counts, points, seconds):
+        self.teams = list(teams)
+        self.counts = counts
+        self.seasons = int(counts[0].sum()) if len(teams) else 0
+        self.points = points
+        self.seconds = seconds
+
+    @property
+    def probabilities(self):
+        return self.counts / max(self.seasons, 1)
+
+    def probability(self, first, last=None):
+        last = first if last is None else last
+        values = self.probabilities[:, first - 1:last].sum(axis=1)
+        return dict(zip(self.teams, values.tolist()))
+
+    def table(self, europe=6, relegation=3):
+        count = len(self.teams)
+        expected = self.probabilities @ np.arange(1, count + 1)
+        columns = {'title': self.probability(1), 'europe': self.probability(1, europe),
+                   'relegation': self.probability(count - relegation + 1, count)}
+        return [{'team': self.teams[team], 'points': int(self.points[team]), 'position': float(expected[team]),
+                 **{name: values[self.teams[team]] for name, values in columns.items()}}
+                for team in np.argsort(expected, kind='stable')]
+
+
+def load_forecast(year=None, matchday=None, history=2, half_life=180, prior=2.0):
+    '''
+        Forecast of the championship year/year+1 (the last one if None) after the matchday (the last one played if
+        None): the matches with a higher number are replayed with the others still to play (a double round robin).
+        The strengths are fitted on the played matches of the season and of the previous history seasons,
+        weighted by exp(-ln 2 * age / half_life), the age in days from the last played match
+    '''
+    if year is None:
+        year = Championship.select(Championship.startyear).order_by(Championship.startyear.desc()).scalar()
+    championship = Championship.get(Championship.startyear == year)
+    rows = list(Match.select(Championship.startyear, Match.number, Match.date, Match.team1, Match.team2,
+                             Match.team1goals, Match.team2goals)
+                .join(Championship)
+                .where(Championship.startyear.between(year - history, year))
+                .order_by(Match.date, Match.id).tuples())
+    current = [row for row in rows if row[0] == year]
+    teams = sorted({row[3] for row in current} | {row[4] for row in current})
+    played = [row for row in rows if row[0] < year or matchday is None or row[1] <= matchday]
+    fitted = sorted({row[3] for row in played} | {row[4] for row in played} | set(teams))
+    code = {team: index for index, team in enumerate(fitted)}
+    _, _, dates, team1, team2, goals1, goals2 = zip(*played) if played else ([],) * 7
+    dates = np.array(dates, dtype='datetime64[D]')
+    age = (dates.max() - dates).astype(float) if len(dates) else np.zeros(0)
+    attack, defence, home, rho = fit_strengths(len(fitted), np.array([code[team] for team in team1], dtype=np.int64),
+                                               np.array([code[team] for team in team2], dtype=np.int64),
+                                               goals1, goals2, np.exp(-np.log(2) * age / half_life), prior)
+    # the strengths of the teams of the championship, in the order of their ids
+    attack, defence = attack[[code[team] for team in teams]], defence[[code[team] for team in teams]]
+    code = {team: index for index, team in enumerate(teams)}
+    season = [row for row in played if row[0] == year]
+    done = {(row[3], row[4]) for row in season}
+    remaining = [(code[home_team], code[away_team]) for home_team in teams for away_team in teams
+                 if home_team != away_team and (home_team, away_team) not in done]
+    names = dict(Team.select(Team.id, Team.name).where(Team.id.in_(teams)).tuples())
+    return Forecast([names[team] for team in teams], championship.rules,
+                    [[code[row[3]] for row in season], [code[row[4]] for row in season],
+                     [row[5] for row in season], [row[6] for row in season]],
+                    np.array(remaining, dtype=np.int64).reshape(-1, 2).T, attack, defence, home, rho)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--year', type=int, default=None,
+                        help='championship to forecast (default: the last one)')
+    parser.add_argument('--matchday', type=int, default=None,
+                        help='forecast after this matchday (default: the last one played)')
+    parser.add_argument('--seasons', type=int, default=100000,
+                        help='number of simulated seasons')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--europe', type=int, default=6,
+                        help='places that qualify for the european cups')
+    parser.add_argument('--relegation', type=int, default=3,
+                        help='places relegated')
+    args = parser.parse_args()
+
+    forecast = load_forecast(args.year, args.matchday)
+    simulation = forecast.simulate(args.seasons, args.workers, args.seed)
+    print(f"{'':24} {'points':>6} {'position':>8} {'title':>7} {'europe':>7} {'releg.':>7}")
+    for row in simulation.table(args.europe, args.relegation):
+        print(f"{row['team']:<24} {row['points']:6d} {row['position']:8.2f} {row['title']:7.1%} "
+              f"{row['europe']:7.1%} {row['relegation']:7.1%}")
+    print(f"{len(forecast.home)} matches to play, {simulation.seasons} seasons simulated in "
+          f"{simulation.seconds:.2f}s ({simulation.seasons / simulation.seconds:.0f} seasons/s)")
@@ -0,0 +1,189 @@
+'''
+Module that stores the scraped championships in a columnar Parquet dataset partitioned by season,
+as an alternative to the sqlite database. Default `data/parquet`
+    matches/season=YEAR/: number, date, team1, team2, team1goals, team2goals
+    scorers/season=YEAR/: number, team1 (key of the match in the matchday), team, scorer, position in the list
+The check compares both tables with the jsons and with the Match and Goal rows of the database
+The usage is
+    python storage.py [--first 1986] [--last 2020] [--check]
+'''
+
+import argparse
+import datetime
+import os
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+ROOT = 'data/parquet'
+
+MATCHES_SCHEMA = pa.schema([('number', pa.int8()),
+                            ('date', pa.date32()),
+                            ('team1', pa.dictionary(pa.int16(), pa.string())),
+                            ('team2', pa.dictionary(pa.int16(), pa.string())),
+                            ('team1goals', pa.int8()),
+                            ('team2goals', pa.int8())])
+SCORERS_SCHEMA = pa.schema([('number', pa.int8()),
+                            ('team1', pa.dictionary(pa.int16(), pa.string())),
+                            ('team', pa.dictionary(pa.int16(), pa.string())),
+                            ('scorer', pa.string()),
+                            ('position', pa.int8())])
+
+
+def season_tables(days):
+    '''
+        Arrow tables (matches, scorers) of the matchdays dictionaries scraped by the spider
+    '''
+    matches = {name: [] for name in MATCHES_SCHEMA.names}
+    scorers = {name: [] for name in SCORERS_SCHEMA.names}
+    for day in sorted(days, key=lambda day: day['number']):
+        date = datetime.date(day['date']['year'], day['date']['month'], day['date']['day'])
+        for match in day['matches']:
+            for name, value in zip(MATCHES_SCHEMA.names,
+                                   (day['number'], date, match['team1']['name'], match['team2']['name'],
+                                    match['team1']['goals'], match['team2']['goals'])):
+                matches[name].append(value)
+            for side in ('team1', 'team2'):
+                for position, scorer in enumerate(match[side].get('scorers', [])):
+                    for name, value in zip(SCORERS_SCHEMA.names,
+                                           (day['number'], match['team1']['name'], match[side]['name'],
+                                            scorer, position)):
+                        scorers[name].append(value)
+    return (pa.Table.from_pydict(matches, schema=MATCHES_SCHEMA),
+            pa.Table.from_pydict(scorers, schema=SCORERS_SCHEMA))
+
+
+def write_season(year, days, root=ROOT):
+    '''
+        Write the matchdays of the championship year/year+1 in the partition season=year of the dataset in root.
+        It replaces the partition if it exists
+    '''
+    for table, name in zip(season_tables(days), ('matches', 'scorers')):
+        directory = os.path.join(root, name, f'season={year}')
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(table, os.path.join(directory, 'part-0.parquet'))
+
+
+def convert(years, root=ROOT):
+    '''
+        Convert the jsons of the championships in years to the dataset in root
+    '''
+    from jsontodb import championship_path, iter_days
+    for year in years:
+        write_season(year, list(iter_days(championship_path(year))), root)
+        print(f"Championship {year}-{(year + 1) % 100} converted.")
+
+
+def open_dataset(name, root=ROOT):
+    '''
+        Arrow dataset of the table name (matches or scorers) of root. The files are memory mapped
+    '''
+    return ds.dataset(os.path.join(root, name), format='parquet', partitioning='hive',
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def read_matches(seasons=None, root=ROOT):
+    '''
+        Arrow table of the matches, optionally only of the championships starting in the years seasons
+    '''
+    dataset = open_dataset('matches', root)
+    if seasons is None:
+        return dataset.to_table()
+    return dataset.to_table(filter=ds.field('season').isin(list(seasons)))
+
+
+def read_scorers(seasons=None, root=ROOT):
+    '''
+        Arrow table of the scorers, optionally only of the championships starting in the years seasons
+    '''
+    dataset = open_dataset('scorers', root)
+    if seasons is None:
+        return dataset.to_table()
+    return dataset.to_table(filter=ds.field('season').isin(list(seasons)))
+
+
+def match_keys(table):
+    '''
+        Sorted list of the matches (season, number, team1, team2, team1goals, team2goals) of an arrow table
+    '''
+    columns = [table.column(name).to_pylist()
+               for name in ('season', 'number', 'team1', 'team2', 'team1goals', 'team2goals')]
+    return sorted(zip(*columns))
+
+
+def scorer_keys(table):
+    '''
+        Sorted list of the scorers (number, team1, team, scorer, position) of an arrow table
+    '''
+    columns = [table.column(name).to_pylist() for name in ('number', 'team1', 'team', 'scorer', 'position')]
+    return sorted(zip(*columns))
+
+
+def goal_keys(scorers):
+    '''
+        Multiset of the goals (number, team1, team, player, minute) of the scorers of scorer_keys,
+        with the names and the minutes parsed as in the Goal rows of the database
+    '''
+    from models import Player
+    return Counter((number, team1, team, *Player.parse(scorer)) for number, team1, team, scorer, position in scorers)
+
+
+def check_round_trip(years, root=ROOT):
+    '''
+        Compare the matches and the scorers in the dataset with the jsons and with the sqlite database
+        (the Match and the Goal rows). Returns the list of the seasons that differ
+    '''
+    from jsontodb import championship_path, iter_days
+    from models import Championship, Goal, Match, Player, Team
+    different = []
+    for year in years:
+        matches, scorers = season_tables(iter_days(championship_path(year)))
+        stored = match_keys(read_matches([year], root))
+        scraped = match_keys(matches.append_column('season', pa.array([year] * len(matches), pa.int32())))
+        home, guest = Team.alias(), Team.alias()
+        database = sorted(Match.select(Championship.startyear, Match.number, home.name, guest.name,
+                                       Match.team1goals, Match.team2goals)
+                          .join_from(Match, Championship)
+                          .join_from(Match, home, on=Match.team1)
+                          .join_from(Match, guest, on=Match.team2)
+                          .where(Championship.startyear == year)
+                          .tuples())
+        stored_scorers, scraped_scorers = scorer_keys(read_scorers([year], root)), scorer_keys(scorers)
+        goals = Counter(Goal.select(Match.number, home.name, Team.name, Player.name, Goal.minute)
+                        .join_from(Goal, Match)
+                        .join_from(Match, home, on=Match.team1)
+                        .join_from(Goal, Team)
+                        .join_from(Goal, Player)
+                        .join_from(Goal, Championship)
+                        .where(Championship.startyear == year)
+                        .tuples())
+        checks = {'matches': stored == scraped == database,
+                  'scorers': stored_scorers == scraped_scorers and goal_keys(stored_scorers) == goals}
+        if not all(checks.values()):
+            different.append(year)
+        print(f"Championship {year}-{(year + 1) % 100}: " +
+              ', '.join(f"{name} {'ok' if same else 'DIFFERENT'}" for name, same in checks.items()))
+    return different
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first', type=int, default=1986,
+                        help='first season to convert')
+    parser.add_argument('--last', type=int, default=2020,
+                        help='last season to convert')
+    parser.add_argument('--root', default=ROOT,
+                        help='directory of the dataset')
+    parser.add_argument('--check', action='store_true',
+                        help='compare the dataset with the jsons and the database instead of converting')
+    args = parser.parse_args()
+    years = range(args.first, args.last + 1)
+
+    if args.check:
+        if check_round_trip(years, args.root):
+            raise SystemExit(1)
+    else:
+        convert(years, args.root)
@@ -0,0 +1,50 @@
+'''
+Fixtures of the tests: a small archive of synthetic championships (benchmarks.generate) in data/ and its database.
+The tests run in the directory of the archive, so the loaders find the championships in data/
+'''
+
+import os
+import shutil
+
+import pytest
+
+from benchmarks.generate import generate
+from jsontodb import load_championship_bulk
+from migrations import MODELS
+from models import db, init_database
+
+# Seasons of the archive: two with 6 teams and two with 12, before and after the 3 points rule
+SMALL = [1992, 1993]
+LARGE = [1994, 1995]
+YEARS = SMALL + LARGE
+
+
+@pytest.fixture(scope='session')
+def archive(tmp_path_factory):
+    '''
+        Directory with the championships of YEARS in data/ and their database data/serieA.db
+    '''
+    directory = tmp_path_factory.mktemp('archive')
+    generate(directory / 'data', seasons=len(SMALL), teams=6, first=SMALL[0])
+    generate(directory / 'data', seasons=len(LARGE), teams=12, first=LARGE[0], seed=1)
+    previous = os.getcwd()
+    os.chdir(directory)
+    init_database(str(directory / 'data' / 'serieA.db'))
+    db.create_tables(MODELS)
+    for year in YEARS:
+        load_championship_bulk(year)
+    db.close()
+    yield directory
+    os.chdir(previous)
+
+
+@pytest.fixture
+def database(archive, tmp_path):
+    '''
+        Path of a copy of the database of the archive, the main database during the test
+    '''
+    path = str(tmp_path / 'serieA.db')
+    shutil.copy(archive / 'data' / 'serieA.db', path)
+    init_database(path)
+    yield path
+    db.close()
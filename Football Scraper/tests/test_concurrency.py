@@ -0,0 +1,18 @@
+'''
+Tests of the concurrent access to the database: reader processes with a short busy timeout query it
+while jsontodb.py --bulk loads the archive. In WAL mode the load never blocks them
+'''
+
+from benchmarks.concurrency import run
+from conftest import YEARS
+
+# Milliseconds a reader waits for a lock: a read blocked by the load fails instead of waiting
+BUSY_TIMEOUT = 0
+
+
+def test_readers_during_bulk_load(archive):
+    load, reads, errors, latencies = run(2, 'wal', YEARS[0], YEARS[-1], busy_timeout=BUSY_TIMEOUT)
+    assert load.returncode == 0, load.stderr
+    assert reads > 0
+    assert errors == []
+    assert latencies[-1] < 1
@@ -0,0 +1,42 @@
+'''
+Crawl of the local mirror of benchmarks.fixtures: a single scrapy process with -a years writes the json lines
+file of every season (SEASON_FILES_DIR) with the matchdays of the scraped championships it serves
+'''
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.fixtures import serve
+from conftest import YEARS
+from jsontodb import championship_path, iter_days
+from seriea.spiders.match_spider import ChampionshipSpider
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('years, expected', [('1986-1988', [1986, 1987, 1988]), ('2020', [2020]),
+                                             ('1986,1990', [1986, 1990]), ('1992-1992', [1992])])
+def test_parse_years(years, expected):
+    assert ChampionshipSpider().parse_years(years) == expected
+    assert ChampionshipSpider(years=years).years == expected
+
+
+def test_crawl_season_files(archive, tmp_path):
+    server = serve(directory=str(archive / 'data'))
+    try:
+        subprocess.run([sys.executable, '-m', 'scrapy', 'crawl', 'match', '-a', f'years={YEARS[0]}-{YEARS[-1]}',
+                        '-a', f'base_url=http://localhost:{server.server_port}',
+                        '-s', f'SEASON_FILES_DIR={tmp_path}', '-s', 'HTTPCACHE_ENABLED=False', '-L', 'WARNING'],
+                       cwd=PROJECT, check=True, capture_output=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert sorted(os.listdir(tmp_path)) == sorted(f'championship{year}.jsonl' for year in YEARS)
+    for year in YEARS:
+        crawled = sorted(iter_days(str(tmp_path / f'championship{year}.jsonl')), key=lambda day: day['number'])
+        source = [dict(day, refyear=year) for day in iter_days(championship_path(year))]
+        assert crawled == source
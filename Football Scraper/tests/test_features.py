@@ -0,0 +1,66 @@
+'''
+Feature store: appending the new matches, or building again after a correction, gives the features of a full build
+'''
+
+import json
+import shutil
+
+import pandas as pd
+
+import jsontodb
+from conftest import LARGE
+from features import append_features, build_features, read_features
+from models import Championship, Match, Matchday
+
+
+def assert_same_features(root, expected_root):
+    features, expected = read_features(root=root), read_features(root=expected_root)
+    for frame in (features, expected):
+        for name in ('team1', 'team2'):
+            frame[name] = frame[name].astype(str)
+    pd.testing.assert_frame_equal(features, expected)
+
+
+def correct_matchday(archive, tmp_path, monkeypatch, year, day):
+    '''
+        Load again the championship year from a copy of the archive with a score of the matchday day changed
+    '''
+    shutil.copytree(archive / 'data', tmp_path / 'data', ignore=shutil.ignore_patterns('*.db*'))
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'data' / f'championship{year}.json'
+    days = json.loads(path.read_text())
+    days[day]['matches'][0]['team2']['goals'] += 2
+    path.write_text(json.dumps(days))
+    return jsontodb.load_championship_bulk(year)
+
+
+def test_append_new_season(database, tmp_path):
+    championship = Championship.get(Championship.startyear == LARGE[1])
+    numbers = [number for number, in Match.select(Match.number).where(Match.championship == championship)
+               .distinct().tuples()]
+    jsontodb.delete_days(championship, numbers)
+    Matchday.delete().where(Matchday.championship == championship).execute()
+    build_features(str(tmp_path / 'features'))
+    added = jsontodb.load_championship_bulk(LARGE[1])
+    assert append_features(str(tmp_path / 'features')) == added > 0
+    assert append_features(str(tmp_path / 'features')) == 0
+    build_features(str(tmp_path / 'expected'))
+    assert_same_features(str(tmp_path / 'features'), str(tmp_path / 'expected'))
+
+
+def test_corrected_past_matchday(database, archive, tmp_path, monkeypatch):
+    build_features(str(tmp_path / 'features'))
+    assert correct_matchday(archive, tmp_path, monkeypatch, LARGE[0], 3) > 0
+    assert append_features(str(tmp_path / 'features')) == Match.select().count()
+    assert set(read_features(root=str(tmp_path / 'features'))['id']) == {id for id, in Match.select(Match.id).tuples()}
+    build_features(str(tmp_path / 'expected'))
+    assert_same_features(str(tmp_path / 'features'), str(tmp_path / 'expected'))
+
+
+def test_corrected_last_matchday(database, archive, tmp_path, monkeypatch):
+    # the matches of the last matchday are replaced with the same ids and dates
+    build_features(str(tmp_path / 'features'))
+    assert correct_matchday(archive, tmp_path, monkeypatch, LARGE[1], -1) > 0
+    assert append_features(str(tmp_path / 'features')) == Match.select().count()
+    build_features(str(tmp_path / 'expected'))
+    assert_same_features(str(tmp_path / 'features'), str(tmp_path / 'expected'))
@@ -0,0 +1,54 @@
+'''
+Tests of the HTTP cache policy: the pages of the past seasons are final, those of the current season are
+always revalidated
+'''
+
+from datetime import date
+
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.settings import Settings
+
+from seriea.httpcache import SeasonPolicy, current_season, season_year
+
+BASE_URL = "https://www.legaseriea.it/it/serie-a/archivio"
+
+
+def matchday(year, number=1):
+    '''
+        Request of the page of a matchday and its cached response, with validators
+    '''
+    url = f"{BASE_URL}/{year}-{(year + 1) % 100:02d}/UNICO/UNI/{number}"
+    headers = {'ETag': '"matchday"', 'Last-Modified': 'Sat, 01 Jan 2000 00:00:00 GMT'}
+    return Request(url), HtmlResponse(url, headers=headers, body=b'<html></html>')
+
+
+def test_current_season():
+    assert current_season(9, date(2021, 5, 23)) == 2020
+    assert current_season(9, date(2020, 8, 2)) == 2019
+    assert current_season(9, date(2020, 9, 19)) == 2020
+    assert season_year(f"{BASE_URL}/1986-87/UNICO/UNI/30") == 1986
+    assert season_year("http://localhost/robots.txt") is None
+
+
+def test_past_season_is_final():
+    policy = SeasonPolicy(Settings())
+    request, cached = matchday(current_season(9) - 1)
+    assert policy.is_cached_response_fresh(cached, request)
+    assert b'If-None-Match' not in request.headers
+
+
+def test_current_season_is_revalidated():
+    policy = SeasonPolicy(Settings())
+    request, cached = matchday(current_season(9), number=38)
+    assert not policy.is_cached_response_fresh(cached, request)
+    assert request.headers[b'If-None-Match'] == b'"matchday"'
+    assert request.headers[b'If-Modified-Since'] == b'Sat, 01 Jan 2000 00:00:00 GMT'
+    # Unchanged page: the cached response is kept, a postponed match or a correction downloads it again
+    assert policy.is_cached_response_valid(cached, Response(request.url, status=304), request)
+    assert not policy.is_cached_response_valid(cached, Response(request.url, status=200), request)
+
+
+def test_season_start_month():
+    policy = SeasonPolicy(Settings({'SERIEA_SEASON_START_MONTH': 1}))
+    request, cached = matchday(date.today().year - 1)
+    assert policy.is_cached_response_fresh(cached, request)
@@ -0,0 +1,111 @@
+'''
+Loading a championship again: the unchanged matchdays are skipped and the changed ones replace their matches
+'''
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import jsontodb
+from conftest import LARGE, SMALL, YEARS
+from instrumentation import profile
+from models import Championship, Goal, Match, Matchday, Rating, Standing, Team, fn
+from ratings import rebuild_ratings
+
+LOADERS = {'row': jsontodb.load_championship,
+           'bulk': jsontodb.load_championship_bulk,
+           'stream': jsontodb.stream_championship}
+
+
+def snapshot(year):
+    '''
+        Matches, goals, final standings and ratings of the championship year, without the ids of the rows
+    '''
+    championship = Championship.get(Championship.startyear == year)
+    matches = sorted(Match.select(Match.number, Match.team1, Match.team2, Match.team1goals, Match.team2goals)
+                     .where(Match.championship == championship).tuples())
+    goals = sorted(Goal.select(Match.number, Goal.team, Goal.player, Goal.minute).join(Match)
+                   .where(Goal.championship == championship).tuples())
+    last = Standing.select(fn.MAX(Standing.matchday)).where(Standing.championship == championship)
+    standings = sorted(Standing.select(Standing.team, Standing.points, Standing.played)
+                       .where((Standing.championship == championship) & (Standing.matchday == last)).tuples())
+    ratings = sorted(Rating.select(Rating.team, Rating.date, Rating.post).tuples())
+    return matches, goals, standings, ratings
+
+
+@pytest.mark.parametrize('loader', LOADERS)
+def test_load_again_skips_unchanged_days(database, loader):
+    before = snapshot(LARGE[0])
+    assert LOADERS[loader](LARGE[0]) == 0
+    assert snapshot(LARGE[0]) == before
+
+
+@pytest.mark.parametrize('loader', LOADERS)
+def test_load_again_replaces_changed_days(database, loader, archive, tmp_path, monkeypatch):
+    shutil.copytree(archive / 'data', tmp_path / 'data', ignore=shutil.ignore_patterns('*.db*'))
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'data' / f'championship{LARGE[0]}.json'
+    days = json.loads(path.read_text())
+    days[3]['matches'][0]['team1']['goals'] += 3
+    days[3]['matches'][0]['team1']['scorers'] += ["Late Scorer 90'"] * 3
+    path.write_text(json.dumps(days))
+    before = snapshot(LARGE[0])
+    assert LOADERS[loader](LARGE[0]) == len(days[3]['matches'])
+    after = snapshot(LARGE[0])
+    assert len(after[0]) == len(before[0]) and after[0] != before[0]
+    assert len(after[1]) == len(before[1]) + 3
+    assert sum(played for team, points, played in after[2]) == 2 * len(after[0])
+    rebuild_ratings()
+    assert snapshot(LARGE[0])[3] == after[3]
+
+
+def delete_season(year):
+    championship = Championship.get(Championship.startyear == year)
+    numbers = [number for number, in Match.select(Match.number).where(Match.championship == championship)
+               .distinct().tuples()]
+    jsontodb.delete_days(championship, numbers)
+    Matchday.delete().where(Matchday.championship == championship).execute()
+
+
+def test_bulk_batch_size(database):
+    before = snapshot(LARGE[0])
+    delete_season(LARGE[0])
+    with pytest.raises(ValueError):
+        jsontodb.load_championship_bulk(LARGE[0], batch_size=jsontodb.MAX_BATCH_SIZE + 1)
+    with profile() as recorded:
+        count = jsontodb.load_championship_bulk(LARGE[0], batch_size=10)
+    inserts = [statement for statement in recorded.statements if statement.sql.startswith('INSERT INTO "match"')]
+    assert len(inserts) == -(-count // 10)
+    assert snapshot(LARGE[0]) == before
+
+
+def test_batch_size_limit(database):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jsontodb.py')
+    environment = dict(os.environ, SERIEA_DATABASE=database)
+    rejected = subprocess.run([sys.executable, script, '--bulk', '--batch-size', str(jsontodb.MAX_BATCH_SIZE + 1)],
+                              capture_output=True, text=True, env=environment)
+    assert rejected.returncode == 2
+    assert '--batch-size must be between 1 and' in rejected.stderr
+
+
+def test_rebuild_goals_skips_seasons(database, archive, tmp_path, monkeypatch):
+    goals = {year: Goal.select().join(Championship).where(Championship.startyear == year).count()
+             for year in YEARS}
+    teams = Team.select().count()
+    shutil.copytree(archive / 'data', tmp_path / 'data', ignore=shutil.ignore_patterns('*.db*'))
+    monkeypatch.chdir(tmp_path)
+    # a season loaded without a file and a file with a match that is not in the database
+    (tmp_path / 'data' / f'championship{SMALL[0]}.json').unlink()
+    path = tmp_path / 'data' / f'championship{LARGE[0]}.json'
+    days = json.loads(path.read_text())
+    days[3]['matches'][0]['team1']['name'] = 'Unknown'
+    path.write_text(json.dumps(days))
+    loaded = jsontodb.rebuild_all_goals()
+    assert loaded == {year: None if year in (SMALL[0], LARGE[0]) else goals[year] for year in YEARS}
+    assert {year: Goal.select().join(Championship).where(Championship.startyear == year).count()
+            for year in YEARS} == goals
+    assert Team.select().count() == teams
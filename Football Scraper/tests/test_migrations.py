@@ -0,0 +1,50 @@
+'''
+Migration of a database with duplicated matches and query plans of the hot queries
+'''
+
+import pytest
+from peewee import IntegrityError
+
+import jsontodb
+from conftest import LARGE, YEARS
+from migrations import migrate, query_plans, uses_indexes
+from models import Championship, Goal, Match, db, fn
+
+
+def test_load_twice_does_not_duplicate(database):
+    matches = Match.select().count()
+    for year in YEARS:
+        jsontodb.load_championship_bulk(year)
+        jsontodb.load_championship(year)
+    assert Match.select().count() == matches
+
+
+def test_unique_match_key(database):
+    match = Match.select().first()
+    with pytest.raises(IntegrityError), db.atomic():
+        Match.insert(championship=match.championship_id, date=match.date, number=match.number, team1=match.team1_id,
+                     team2=match.team2_id, team1goals=0, team2goals=0, pairlow=match.pairlow,
+                     pairhigh=match.pairhigh).execute()
+
+
+def test_migrate_merges_duplicated_matches(database):
+    championship = Championship.get(Championship.startyear == LARGE[0])
+    matches, goals = Match.select().count(), Goal.select().count()
+    team_matches = sorted(Match.select(Match.team1, fn.COUNT(Match.id)).group_by(Match.team1).tuples())
+    # a database of an older version of the models, without the unique index, loaded twice
+    db.execute_sql('DROP INDEX match_championship_id_number_team1_id')
+    columns = ', '.join(column.name for column in db.get_columns('match') if column.name != 'id')
+    db.execute_sql(f'INSERT INTO match ({columns}) SELECT {columns} FROM match WHERE championship_id = ?',
+                   (championship.id,))
+    assert Match.select().count() > matches
+    migrate()
+    assert Match.select().count() == matches
+    assert Goal.select().count() == goals
+    assert sorted(Match.select(Match.team1, fn.COUNT(Match.id)).group_by(Match.team1).tuples()) == team_matches
+    assert 'match_championship_id_number_team1_id' in [index.name for index in db.get_indexes('match')]
+
+
+def test_query_plans_use_indexes(database):
+    migrate()
+    scans = {name: details for name, details in query_plans().items() if not uses_indexes(details)}
+    assert scans == {}
@@ -0,0 +1,42 @@
+'''
+DatabasePipeline: a batch that fails is rolled back without leaving stale ids in the maps of the pipeline
+'''
+
+import pytest
+from peewee import IntegrityError
+
+from models import Championship, Match, Team
+from seriea.pipelines import DatabasePipeline
+
+
+def matchday(number, *matches):
+    '''
+        Matchday dictionary of the season 2030 with the matches (home, away, home goals, away goals)
+    '''
+    return {'number': number, 'date': {'day': number, 'month': 9, 'year': 2030}, 'refyear': 2030,
+            'matches': [{'team1': {'name': home, 'goals': goals1, 'scorers': []},
+                         'team2': {'name': away, 'goals': goals2, 'scorers': []}}
+                        for home, away, goals1, goals2 in matches]}
+
+
+def stored_matches():
+    home, guest = Team.alias(), Team.alias()
+    return sorted(Match.select(Match.number, home.name, guest.name, Match.team1goals, Match.team2goals)
+                  .join_from(Match, home, on=Match.team1)
+                  .join_from(Match, guest, on=Match.team2)
+                  .join_from(Match, Championship)
+                  .where(Championship.startyear == 2030)
+                  .tuples())
+
+
+def test_failed_batch_does_not_leave_ids(database):
+    pipeline = DatabasePipeline(database, batch_days=1)
+    pipeline.connect()
+    # a match without the score: the batch is rolled back with the new teams Alpha and Beta
+    with pytest.raises(IntegrityError):
+        pipeline.write([matchday(1, ('Alpha', 'Beta', None, None))])
+    assert 'Alpha' not in pipeline.teams and 'Beta' not in pipeline.teams
+    assert pipeline.write([matchday(1, ('Gamma', 'Delta', 1, 0))]) == 1
+    assert pipeline.write([matchday(2, ('Alpha', 'Gamma', 2, 2), ('Beta', 'Delta', 0, 3))]) == 2
+    assert stored_matches() == [(1, 'Gamma', 'Delta', 1, 0), (2, 'Alpha', 'Gamma', 2, 2), (2, 'Beta', 'Delta', 0, 3)]
+    assert pipeline.teams == dict(Team.select(Team.name, Team.id).tuples())
@@ -0,0 +1,40 @@
+'''
+Number of queries of the iteration over the matches: it must not grow with the number of matches
+'''
+
+from conftest import LARGE, SMALL
+from instrumentation import profile
+from models import Championship, Match, Team, get_results
+
+
+def season_matches(year):
+    championship = Championship.get(Championship.startyear == year)
+    with profile() as recorded:
+        descriptions = [str(match) for match in Match.with_teams().where(Match.championship == championship)]
+    return len(descriptions), recorded.queries
+
+
+def test_season_matches_fixed_queries(database):
+    small, small_queries = season_matches(SMALL[0])
+    large, large_queries = season_matches(LARGE[0])
+    assert large > 2 * small
+    assert small_queries == large_queries == 1
+
+
+def test_team_matches_fixed_queries(database):
+    team = Team.select().order_by(Team.id).first()
+    with profile() as recorded:
+        descriptions = [str(match) for match in team.matches()]
+    assert len(descriptions) > 10
+    assert recorded.queries == 1
+
+
+def test_get_results_does_not_load_teams(database):
+    championship = Championship.get(Championship.startyear == LARGE[0])
+    team = championship.playing_teams.first()
+    matches = list(championship.championship_matches.where((Match.team1 == team) | (Match.team2 == team)))
+    with profile() as recorded:
+        results = get_results(team, matches, championship.rules)
+    assert recorded.queries == 0
+    assert results['played'] == len(matches) == 22
+    assert results['won'] + results['even'] + results['lost'] == results['played']
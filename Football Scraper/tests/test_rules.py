@@ -0,0 +1,77 @@
+'''
+Scoring rules of the seasons: 2 points for a win up to 1993-94, the head to head tiebreakers, and the same
+ranking from the queries, the DataFrames, the stored standings and the replays
+'''
+
+import datetime
+
+import pytest
+
+import jsontodb
+from conftest import LARGE, SMALL, YEARS
+from models import Championship, Standing, Team, fn, frame_ranking, load_matches_frame
+from replay import load_replays
+from rules import Rules, results_record, season_points, season_rules
+
+
+def test_season_rules():
+    assert [season_rules(year).win for year in (1986, SMALL[0], 1993, 1994, LARGE[1], 2020)] == [2, 2, 2, 3, 3, 3]
+    assert season_rules(1993).points(10, 5, 3) == 25
+    assert season_rules(1994).points(10, 5, 3) == 35
+
+
+def test_season_points(database):
+    points = dict(Championship.select(Championship.startyear, season_points(Championship.startyear, 'win'))
+                  .tuples())
+    assert points == {year: 2 if year < 1994 else 3 for year in YEARS}
+    for year in YEARS:
+        win = season_rules(year).win
+        for results in Championship.get(Championship.startyear == year).ranking():
+            assert results['points'] == win * results['won'] + results['even']
+
+
+def test_head_to_head_before_goal_difference():
+    stats = {'Alpha': {'points': 4, 'scored': 3, 'taken': 3},
+             'Beta': {'points': 4, 'scored': 9, 'taken': 2},
+             'Gamma': {'points': 1, 'scored': 1, 'taken': 8}}
+    head_to_head = {('Alpha', 'Beta'): {'points': 3, 'scored': 1, 'taken': 0},
+                    ('Beta', 'Alpha'): {'points': 0, 'scored': 0, 'taken': 1}}
+    record = results_record(stats, head_to_head)
+    assert Rules().order(stats, record) == ['Alpha', 'Beta', 'Gamma']
+    assert Rules(tiebreakers=Rules().tiebreakers[2:]).order(stats, record) == ['Beta', 'Alpha', 'Gamma']
+
+
+def rankings(year):
+    '''
+        Final ranking of the championship year as lists of (team, points): from Championship.ranking,
+        frame_ranking, the standings of the last matchday and the replay
+    '''
+    championship = Championship.get(Championship.startyear == year)
+    frame = frame_ranking(load_matches_frame([year]))
+    last = Standing.select(fn.MAX(Standing.matchday)).where(Standing.championship == championship).scalar()
+    standings = (Standing.select(Team.name, Standing.points).join(Team)
+                 .where((Standing.championship == championship) & (Standing.matchday == last))
+                 .order_by(Standing.position).tuples())
+    return [[(results['team'], results['points']) for results in championship.ranking()],
+            [(str(team), int(points)) for team, points in zip(frame['team'], frame['points'])],
+            list(standings),
+            [(results['team'], results['points']) for results in load_replays([year])[year].table()]]
+
+
+@pytest.mark.parametrize('year', YEARS)
+def test_same_ranking(database, year):
+    ranking, *others = rankings(year)
+    assert len(ranking) == (6 if year in SMALL else 12)
+    assert all(other == ranking for other in others)
+
+
+@pytest.mark.parametrize('year', [1990, 2030])
+def test_same_ranking_head_to_head(database, year):
+    # X and Y have the same points: Y has the better goal difference, X won the match between them
+    date = datetime.datetime(year, 9, 1)
+    rows = [(1, date, 'X', 'Y', 1, 0, [], []), (1, date, 'Z', 'W', 0, 0, [], []),
+            (2, date, 'Y', 'W', 5, 0, [], []), (2, date, 'Z', 'X', 1, 0, [], [])]
+    jsontodb.write_championship(year, rows, jsontodb.team_ids())
+    win = season_rules(year).win
+    expected = [('Z', win + 1), ('X', win), ('Y', win), ('W', 1)]
+    assert all(ranking == expected for ranking in rankings(year))
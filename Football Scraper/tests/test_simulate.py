@@ -0,0 +1,59 @@
+'''
+Monte Carlo forecast: the vectorized ranking of the simulated seasons is the one of Rules.order,
+and the pool of processes gives the same counts as a single process
+'''
+
+import numpy as np
+import pytest
+
+from conftest import LARGE
+from rules import season_rules
+from simulate import BATCH, Forecast, load_forecast
+
+
+def random_state(rng, seasons, count):
+    '''
+        Matches (home, away) of a double round robin of count teams and their goals (arrays (season, match))
+        in seasons random seasons. Few goals, so many teams are tied on points and on some tiebreakers
+    '''
+    home, away = (np.array(codes) for codes in zip(*[(team1, team2) for team1 in range(count)
+                                                      for team2 in range(count) if team1 != team2]))
+    goals1, goals2 = rng.integers(0, 3, (2, seasons, len(home)))
+    return home, away, goals1, goals2
+
+
+def test_order_as_rules():
+    rng = np.random.default_rng(0)
+    count, seasons = 6, 500
+    home, away, goals1, goals2 = random_state(rng, seasons, count)
+    for year in (1990, LARGE[0]):
+        rules = season_rules(year)
+        forecast = Forecast([str(team) for team in range(count)], rules, ([], [], [], []), (home, away),
+                            np.ones(count), np.ones(count), 1.0, 0.0)
+        won, even, lost = goals1 > goals2, goals1 == goals2, goals1 < goals2
+        state = {}
+        for name, values1, values2 in (('points', rules.points(won.astype(np.int64), even, lost),
+                                        rules.points(lost.astype(np.int64), even, won)),
+                                       ('scored', goals1, goals2), ('taken', goals2, goals1)):
+            versus = np.zeros((seasons, count, count), dtype=np.int64)
+            versus[:, home, away] += values1
+            versus[:, away, home] += values2
+            state['versus_' + name], state[name] = versus, versus.sum(axis=2)
+        order = forecast.order(state)
+        for season in range(seasons):
+            def record(team, opponent=None):
+                if opponent is None:
+                    return tuple(int(state[name][season, team]) for name in ('points', 'scored', 'taken'))
+                return tuple(int(state['versus_' + name][season, team, opponent])
+                             for name in ('points', 'scored', 'taken'))
+            assert order[season].tolist() == rules.order(range(count), record)
+
+
+@pytest.mark.parametrize('seed', [0, 7])
+def test_pool_as_single_process(database, seed):
+    forecast = load_forecast(LARGE[1], matchday=11)
+    seasons = 2 * BATCH + 100
+    single = forecast.simulate(seasons, workers=1, seed=seed)
+    pool = forecast.simulate(seasons, workers=2, seed=seed)
+    assert single.seasons == pool.seasons == seasons
+    assert np.array_equal(single.counts, pool.counts)
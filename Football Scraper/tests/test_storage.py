@@ -0,0 +1,27 @@
+'''
+Round trip of the championships through the Parquet dataset: matches and scorers against the jsons and the database
+'''
+
+from conftest import LARGE, YEARS
+from models import Goal, Match, Championship
+from storage import check_round_trip, convert, read_scorers
+
+
+def test_round_trip(database, tmp_path):
+    convert(YEARS, str(tmp_path))
+    assert read_scorers(root=str(tmp_path)).num_rows == Goal.select().count() > 0
+    assert check_round_trip(YEARS, str(tmp_path)) == []
+
+
+def test_round_trip_finds_changed_goals(database, tmp_path):
+    convert(YEARS, str(tmp_path))
+    goal = Goal.select().join(Championship).where(Championship.startyear == LARGE[0]).first()
+    Goal.update(minute=(goal.minute or 0) + 1).where(Goal.id == goal.id).execute()
+    assert check_round_trip(YEARS, str(tmp_path)) == [LARGE[0]]
+
+
+def test_round_trip_finds_changed_matches(database, tmp_path):
+    convert(YEARS, str(tmp_path))
+    match = Match.select().join(Championship).where(Championship.startyear == LARGE[1]).first()
+    Match.update(team1goals=match.team1goals + 1).where(Match.id == match.id).execute()
+    assert check_round_trip(YEARS, str(tmp_path)) == [LARGE[1]]